@@ -0,0 +1,35 @@
+"""Benchmark of the long-to-wide reshape used by the catchment data readers.
+
+Times models.read_variable_from_csv on synthetic 15-minute rain exports of
+increasing size, and reports the time per row so that linear scaling in both
+rows and sites can be checked.
+
+Usage: python benchmarks/bench_reshape.py
+"""
+
+import os
+import tempfile
+import time
+
+from catchment import cache, models
+from synthetic import DATE_FORMATS, synthetic_dataset, write_export
+
+
+def main():
+    cache.set_enabled(False)
+    print(f"{'sites':>6} {'times':>8} {'rows':>9} {'seconds':>9} {'us/row':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_sites, num_times in [(5, 2976), (10, 2976), (40, 2976), (40, 2976 * 4), (40, 2976 * 12)]:
+            filename = os.path.join(tmp_dir, f'rain_{num_sites}_{num_times}.csv')
+            write_export(synthetic_dataset(num_sites, periods=num_times), filename)
+
+            start = time.perf_counter()
+            models.read_variable_from_csv(filename, date_format=DATE_FORMATS['rain'])
+            elapsed = time.perf_counter() - start
+
+            rows = num_sites * num_times
+            print(f'{num_sites:>6} {num_times:>8} {rows:>9} {elapsed:>9.3f} {1e6 * elapsed / rows:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark suite for the load -> aggregate -> analyse pipeline.
+
+Generates synthetic rain exports of a chosen size (sites x months of 15 minute
+readings), then times each stage of the pipeline: the CSV, JSON and XML
+readers, the daily statistics, normalisation and compute_data.analyse_data.
+Each stage reports its best time over several repeats, its throughput in
+input rows per second and its peak traced memory.
+
+Results can be saved as JSON and compared against an earlier run, in which
+case any stage slower than the threshold ratio is reported as a regression
+and the script exits with status 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sites 20 --months 3 --output new.json
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from catchment import cache, compute_data, models
+from synthetic import DATE_FORMATS, write_monthly_exports
+
+
+def measure(stage, repeats):
+    """Time a stage over several repeats, then run it once more under tracemalloc for peak memory."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        stage()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def build_stages(dir_path, csv_files, json_files, xml_files):
+    """Return a dictionary of stage name -> (callable, rows processed)."""
+    date_format = DATE_FORMATS['rain']
+    data = models.read_variable_from_csv(csv_files[0], date_format=date_format)
+    rows = data.size
+
+    def read_all(reader, filenames):
+        return lambda: [reader(filename, date_format=date_format) for filename in filenames]
+
+    return {
+        'read_variable_from_csv': (read_all(models.read_variable_from_csv, csv_files), rows * len(csv_files)),
+        'read_variable_from_json': (read_all(models.read_variable_from_json, json_files), rows * len(json_files)),
+        'read_variable_from_xml': (read_all(models.read_variable_from_xml, xml_files), rows * len(xml_files)),
+        'daily_total': (lambda: models.daily_total(data), rows),
+        'daily_mean': (lambda: models.daily_mean(data), rows),
+        'daily_max': (lambda: models.daily_max(data), rows),
+        'daily_min': (lambda: models.daily_min(data), rows),
+        'daily_summary': (lambda: models.daily_summary(data), rows),
+        'data_normalise': (lambda: models.data_normalise(data), rows),
+        'analyse_data': (lambda: compute_data.analyse_data(compute_data.CSVDataSource(dir_path)),
+                         rows * len(csv_files)),
+    }
+
+
+def run(num_sites, num_months, repeats, stage_names=None):
+    """Run the benchmark suite, returning a dictionary of results per stage."""
+    cache.set_enabled(False)
+    results = {}
+    with tempfile.TemporaryDirectory() as dir_path:
+        csv_files = write_monthly_exports(dir_path, num_sites, num_months, '.csv')
+        json_files = write_monthly_exports(dir_path, num_sites, num_months, '.json')
+        xml_files = write_monthly_exports(dir_path, num_sites, min(num_months, 1), '.xml')
+
+        for name, (stage, rows) in build_stages(dir_path, csv_files, json_files, xml_files).items():
+            if stage_names and name not in stage_names:
+                continue
+            seconds, peak = measure(stage, repeats)
+            results[name] = {'seconds': seconds, 'rows': rows, 'rows_per_second': rows / seconds,
+                             'peak_bytes': peak}
+            print(f"{name:<26} {seconds:>9.4f} s {rows / seconds:>14,.0f} rows/s {peak / 1024 ** 2:>9.1f} MiB")
+
+    return {'sites': num_sites, 'months': num_months, 'stages': results}
+
+
+def compare(old, new, threshold):
+    """Print the change in time of each stage between two runs, returning the stages that regressed."""
+    regressions = []
+    print(f"{'stage':<26} {'old (s)':>9} {'new (s)':>9} {'ratio':>7}")
+    for name, result in new['stages'].items():
+        if name not in old['stages']:
+            continue
+        ratio = result['seconds'] / old['stages'][name]['seconds']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<26} {old['stages'][name]['seconds']:>9.4f} {result['seconds']:>9.4f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(description='Benchmark the catchment data pipeline')
+    parser.add_argument('--sites', type=int, default=10, help='Number of synthetic sites')
+    parser.add_argument('--months', type=int, default=2, help='Number of months of 15 minute data')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed repeats of each stage')
+    parser.add_argument('--stages', nargs='+', help='Only run the named stages')
+    parser.add_argument('--output', help='Save the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compare two saved runs instead of running the benchmarks')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Time ratio above which a stage counts as a regression')
+    return parser
+
+
+def main(args):
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            regressions = compare(json.load(old_file), json.load(new_file), args.threshold)
+        return 1 if regressions else 0
+
+    results = run(args.sites, args.months, args.repeats, args.stages)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(create_argparse().parse_args()))
@@ -0,0 +1,74 @@
+"""Generator of synthetic rain and river data exports for benchmarking.
+
+The exports have the same layout as the sample files in data/: one row per
+site per 15 minute reading, in CSV, JSON or XML.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+RAIN_COLUMNS = ['Rainfall (mm)']
+RIVER_COLUMNS = ['Battery (V)', 'Conductivity 25C continuous (uS/cm)', 'Oxygen dissolved continuous (%satn)',
+                 'pH continuous', 'Temperature water continuous (C)', 'Water level continuous (mm)']
+
+# Date formats used by the sample rain and river exports
+DATE_FORMATS = {'rain': '%d/%m/%Y %H:%M', 'river': '%Y-%m-%d %H:%M:%S'}
+
+
+def synthetic_dataset(num_sites, start='2005-12-01', periods=2976, kind='rain', seed=0):
+    """Build a long-format dataset of 15 minute readings.
+
+    :param num_sites: Number of measurement sites
+    :param start: Time of the first reading
+    :param periods: Number of readings per site
+    :param kind: 'rain' for rain gauge data, 'river' for river sensor data
+    :param seed: Seed of the random number generator
+    :returns: Pandas dataframe with Site, Site Name, Date and measurement columns
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=periods, freq='15min').strftime(DATE_FORMATS[kind])
+    sites = [f'S{i:03d}' for i in range(num_sites)]
+    rows = num_sites * periods
+
+    dataset = pd.DataFrame({
+        'Site': np.repeat(sites, periods),
+        'Site Name': np.repeat([f'Synthetic site {i}' for i in range(num_sites)], periods),
+        'Date': np.tile(dates, num_sites),
+    })
+    if kind == 'rain':
+        dataset['Rainfall (mm)'] = (rng.random(rows) < 0.1) * rng.gamma(0.5, 0.4, rows).round(1)
+    else:
+        for i, column in enumerate(RIVER_COLUMNS):
+            dataset[column] = (10.0 * (i + 1) + rng.normal(0.0, 1.0, rows)).round(2)
+    return dataset
+
+
+def write_export(dataset, filename):
+    """Write a dataset in the format given by the file extension (.csv, .json or .xml)."""
+    _, extension = os.path.splitext(filename)
+    if extension == '.csv':
+        dataset.to_csv(filename, index=False)
+    elif extension == '.json':
+        dataset.to_json(filename, orient='records', indent=4)
+    elif extension == '.xml':
+        renamed = dataset.rename(columns={'Site Name': 'Site_Name', 'Rainfall (mm)': 'Rainfall_mm'})
+        renamed.to_xml(filename, index=False, root_name='dataset', row_name='data', parser='etree')
+    else:
+        raise ValueError(f'Unsupported file format: {extension}')
+
+
+def write_monthly_exports(dir_path, num_sites, num_months, extension='.csv', kind='rain', seed=0):
+    """Write one export per month, named so that the compute_data data sources find them.
+
+    :returns: List of the filenames written
+    """
+    filenames = []
+    for month, start in enumerate(pd.date_range('2005-12-01', periods=num_months, freq='MS')):
+        periods = start.days_in_month * 24 * 4
+        filename = os.path.join(dir_path, f'{kind}_data_2015-{month + 1:03d}{extension}')
+        write_export(synthetic_dataset(num_sites, start, periods, kind, seed + month), filename)
+        filenames.append(filename)
+    return filenames
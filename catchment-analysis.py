@@ -4,8 +4,29 @@ project."""
 
 import argparse
 import os
+import sys
 
-from catchment import models, views, compute_data
+
+def comma_separated(value):
+    """Split a comma-separated command line value into a list, so an option never takes the input files."""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def present(view_data, name, args, figure_jobs):
+    """Send results to the chosen outputs: data files, image files, or interactive plots.
+
+    Views are imported here so that batch runs writing data files never load Matplotlib.
+    """
+    from catchment import instrument, views
+
+    if args.output_dir:
+        with instrument.stage('write_output'):
+            views.save_data(view_data, args.output_dir, name, args.output_format)
+    if args.plot_dir:
+        figure_jobs.append((view_data, os.path.join(args.plot_dir, views.output_name(name) + '.png')))
+    if not args.output_dir and not args.plot_dir:
+        with instrument.stage('plot'):
+            views.visualize(view_data)
 
 
 def main(args):
@@ -14,20 +35,39 @@ def main(args):
     The Controller is responsible for:
     - selecting the necessary models and views for the current task
     - passing data between models and views
+
+    The catchment modules, and so pandas and NumPy, are only imported once the
+    arguments have been parsed, so that --help and argument errors are quick.
     """
+    from catchment import cache, compute_data, instrument, quality
+
+    if args.clear_cache:
+        cache.clear()
+    if args.no_cache:
+        cache.set_enabled(False)
+    if args.profile or args.profile_trace:
+        instrument.set_enabled(True, args.profile_memory)
+
     InFiles = args.infiles
     if not isinstance(InFiles, list):
         InFiles = [args.infiles]
+
+    figure_jobs = []
     
     if args.full_data_analysis:
         _, extension = os.path.splitext(InFiles[0])
 
         if extension == '.csv':
             print("Running CSV")
-            data_source = compute_data.CSVDataSource(os.path.dirname(InFiles[0]))
+            data_source = compute_data.CSVDataSource(os.path.dirname(InFiles[0]),
+                                                     start=args.start, end=args.end, sites=args.sites,
+                                                     checks=quality.RAIN_CHECKS if args.quality else None)
+        elif args.quality:
+            raise ValueError('Quality checks are only supported for CSV files')
         elif extension == '.json':
             print("Running JSON")
-            data_source = compute_data.JSONDataSource(os.path.dirname(InFiles[0]))
+            data_source = compute_data.JSONDataSource(os.path.dirname(InFiles[0]),
+                                                      start=args.start, end=args.end, sites=args.sites)
         else:
             raise ValueError(f'Unsupported file format: {extension}')
 
@@ -37,14 +77,47 @@ def main(args):
             'daily standard deviation': daily_standard_deviation
         }
 
-        views.visualize(graph_data)
+        present(graph_data, 'full_data_analysis', args, figure_jobs)
+
+    measurements = args.measurements
+    if measurements is None:
+        measurements = ['Rainfall (mm)']
+
+    failures = 0
+    summaries = compute_data.summarise_files(InFiles, measurements, workers=args.jobs,
+                                             start=args.start, end=args.end, sites=args.sites)
+    for filename, summary, error, seconds in summaries:
+        if error is not None:
+            failures += 1
+            print(f'{filename}: failed after {seconds:.2f} s: {error}', file=sys.stderr)
+            continue
+        print(f'{filename}: {seconds:.2f} s', file=sys.stderr)
+
+        for measurement in measurements:
+            daily_stats = summary[measurement]
+            view_data = {'daily sum': daily_stats['sum'], 'daily average': daily_stats['mean'], 'daily max': daily_stats['max'], 'daily min': daily_stats['min']}
+
+            name = os.path.splitext(os.path.basename(filename))[0] + '_' + measurement
+            present(view_data, name, args, figure_jobs)
 
-    for filename in InFiles:
-        measurement_data = models.read_variable_from_csv(filename, args.measurements)
-        
-        view_data = {'daily sum': models.daily_total(measurement_data), 'daily average': models.daily_mean(measurement_data), 'daily max': models.daily_max(measurement_data), 'daily min': models.daily_min(measurement_data)}
-        
-        views.visualize(view_data)
+    if figure_jobs:
+        from catchment import views
+
+        os.makedirs(args.plot_dir, exist_ok=True)
+        with instrument.stage('plot'):
+            views.save_figures(figure_jobs, args.jobs)
+
+    if args.profile:
+        print(instrument.format_summary(instrument.records(), 'stage'), file=sys.stderr)
+        print(file=sys.stderr)
+        print(instrument.format_summary(instrument.records(), 'file'), file=sys.stderr)
+    if args.profile_trace:
+        instrument.write_trace(args.profile_trace, instrument.records())
+
+    if failures:
+        print(f'{failures} of {len(InFiles)} input files failed', file=sys.stderr)
+        return 1
+    return 0
 
 
 def create_argparse():
@@ -60,13 +133,75 @@ def create_argparse():
 
     req_group.add_argument(
         '-m', '--measurements',
-        help='Name of measurement data series to load',
+        action='append',
+        help='Name of a measurement data series to load; repeat the option to load several',
     )
 
     parser.add_argument('--full-data-analysis',
                         action='store_true',
                         dest='full_data_analysis')
 
+    parser.add_argument('--quality',
+                        action='store_true',
+                        help='Check the quality of the readings in the full data analysis, leaving out '
+                             'out of range, stuck and duplicated readings')
+
+    parser.add_argument('--from',
+                        dest='start',
+                        help='Only use measurements taken at or after this date and time, '
+                             'e.g. 2005-12-01 or 01/12/2005 06:00')
+
+    parser.add_argument('--to',
+                        dest='end',
+                        help='Only use measurements taken at or before this date and time; '
+                             'a date alone includes the whole of that day')
+
+    parser.add_argument('--sites',
+                        type=comma_separated,
+                        help='Only use measurements from these comma-separated site IDs, e.g. FP35,PL16')
+
+    parser.add_argument('--output-dir',
+                        dest='output_dir',
+                        help='Write the computed statistics to data files in this directory instead of plotting')
+
+    parser.add_argument('--output-format',
+                        dest='output_format',
+                        choices=['csv', 'json', 'parquet'],
+                        default='csv',
+                        help='Format of the data files written to --output-dir')
+
+    parser.add_argument('--plot-dir',
+                        dest='plot_dir',
+                        help='Save plots as PNG files in this directory instead of displaying them')
+
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of worker processes to read and summarise input files, and to save plots')
+
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='Print the time, rows and memory of each stage of the analysis and each input file')
+
+    parser.add_argument('--profile-trace',
+                        dest='profile_trace',
+                        help='Write every profiled stage to this JSON file')
+
+    parser.add_argument('--profile-memory',
+                        action='store_true',
+                        dest='profile_memory',
+                        help='Also trace the peak memory allocated by each stage, which is much slower')
+
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        dest='no_cache',
+                        help='Parse every input file, bypassing the cache of parsed data')
+
+    parser.add_argument('--clear-cache',
+                        action='store_true',
+                        dest='clear_cache',
+                        help='Delete all cached parsed data before running')
+
     return parser
 
 
@@ -76,4 +211,4 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    main(args)
+    sys.exit(main(args))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Resident analysis server for our field project's data, and a client to query it.
+
+Start a server holding the monthly data files of a directory in memory:
+
+    python catchment-server.py serve data --format csv
+
+then ask it questions, printing the JSON answer:
+
+    python catchment-server.py query daily --file rain_data_2015-12.csv --stats sum,max --sites FP35
+    python catchment-server.py query std --from 2005-12-01 --to 2005-12-07
+"""
+
+import argparse
+import json
+import sys
+
+
+def main(args):
+    """Run the server, or send it one request and print the answer."""
+    from catchment import server
+
+    if args.command == 'serve':
+        server.serve(args.data_dir, args.format, args.port, args.max_mib * 1024 ** 2)
+        return 0
+
+    params = {'file': args.file, 'from': args.start, 'to': args.end, 'mode': args.mode,
+              'stats': args.stats, 'sites': args.sites}
+    try:
+        answer = server.query(args.request, args.port, **params)
+    except ValueError as exc:
+        print(f'Error: {exc}', file=sys.stderr)
+        return 1
+    except OSError as exc:
+        print(f'Cannot reach the server on port {args.port}: {exc}', file=sys.stderr)
+        return 1
+    json.dump(answer, sys.stdout)
+    print()
+    return 0
+
+
+def create_argparse():
+    parser = argparse.ArgumentParser(
+        description='Keep environmental data in memory and answer questions about it')
+    parser.add_argument('--port', type=int, default=8765, help='Port of the server, on localhost')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='Run the server until interrupted')
+    serve_parser.add_argument('data_dir', help='Directory of monthly data files')
+    serve_parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                              help='Format of the data files')
+    serve_parser.add_argument('--max-mib', dest='max_mib', type=int, default=1024,
+                              help='Memory to hold data in before dropping the least recently used files')
+
+    query_parser = commands.add_parser('query', help='Send a request to a running server')
+    query_parser.add_argument('request', choices=['daily', 'std', 'normalised', 'status'])
+    query_parser.add_argument('--file', help='Name of the data file, for daily and normalised requests')
+    query_parser.add_argument('--stats', help='Comma-separated daily statistics to calculate, e.g. sum,max')
+    query_parser.add_argument('--mode', help='Mode of normalisation: max, minmax or zscore')
+    query_parser.add_argument('--from', dest='start', help='Only use measurements taken at or after this time')
+    query_parser.add_argument('--to', dest='end',
+                              help='Only use measurements taken at or before this time; a date alone is the whole day')
+    query_parser.add_argument('--sites', help='Only use measurements from these comma-separated site IDs')
+
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main(create_argparse().parse_args()))
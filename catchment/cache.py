@@ -0,0 +1,242 @@
+"""Module containing an on-disk cache of parsed catchment data.
+
+Reading a data file means parsing text and reshaping it into a 2D array,
+which is slow for the larger JSON and XML exports. The readers in the models
+module are wrapped with `cached`, which stores the resulting dataframe in a
+binary NumPy file keyed by the source file's path, modification time and size,
+and by the arguments (e.g. measurement column) the reader was called with.
+Re-reading an unchanged file then loads the array directly.
+
+Date and site filters (start, end and sites) are not part of the key: the
+whole file is cached and the filters applied to it. So with the cache on, the
+first filtered read of a file parses and stores all of it, and later reads
+with any filters slice the stored data. With the cache off (--no-cache), the
+filters are instead applied while parsing, which reads less.
+
+The cache lives in the directory named by the CATCHMENT_CACHE_DIR environment
+variable, or ~/.cache/catchment by default. Least recently used entries are
+removed once it grows beyond MAX_CACHE_BYTES.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from catchment import instrument
+
+
+MAX_CACHE_BYTES = 512 * 1024 ** 2
+
+# Cached datasets are saved as <SHA-1 of cache key>.npz, and site to catchment
+# mappings (see spatial.site_catchments) as site_catchments_<SHA-1 of inputs>.csv;
+# entries being written are temporary .tmp files until complete
+ENTRY_PATTERN = re.compile(r'[0-9a-f]{40}\.npz|site_catchments_[0-9a-f]{40}\.csv')
+
+# Reader arguments that filter the data read, rather than change how it is read
+FILTERS = ('start', 'end', 'sites')
+
+# Reader arguments that tune how the file is read, without changing the data read
+TUNING = ('buffer_size',)
+
+_enabled = True
+
+
+def cache_dir():
+    """Return the directory cached data is stored in."""
+    return os.environ.get('CATCHMENT_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'catchment'))
+
+
+def set_enabled(enabled):
+    """Turn the cache on or off for the rest of this process."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def _is_entry(name):
+    """Check a file name is that of a cache entry, rather than a write in progress or someone else's file."""
+    return ENTRY_PATTERN.fullmatch(name) is not None
+
+
+def clear():
+    """Delete every cache entry, leaving anything else in the cache directory alone."""
+    directory = cache_dir()
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if _is_entry(name):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def cache_key(reader_name, filename, arguments):
+    """Build the cache key of a dataset from its source file and reader arguments.
+
+    :param reader_name: Name of the function used to read the file
+    :param filename: Path of the source data file
+    :param arguments: Dictionary of any other arguments passed to the reader
+    :returns: Hex digest identifying the parsed dataset
+    """
+    stat = os.stat(filename)
+    description = repr((reader_name, os.path.abspath(filename), stat.st_mtime_ns, stat.st_size,
+                        sorted(arguments.items())))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def load(key):
+    """Load a cached dataframe (or dictionary of dataframes), or return None
+    if it is not in the cache."""
+    path = os.path.join(cache_dir(), key + '.npz')
+    try:
+        with np.load(path, allow_pickle=False) as stored:
+            frames = [pd.DataFrame(stored[f'values_{i}'].astype(stored[f'dtype_{i}'].item(), copy=False),
+                                   index=pd.DatetimeIndex(stored[f'index_{i}']),
+                                   columns=pd.Index(stored[f'columns_{i}'].astype(object)))
+                      for i in range(len(stored['names']))]
+            data = frames[0] if stored['single'] else dict(zip(stored['names'].tolist(), frames))
+    except (OSError, KeyError, ValueError):
+        return None
+
+    # Mark the entry as recently used so it is evicted last
+    os.utime(path)
+    return data
+
+
+def _cacheable(data):
+    """Check a dataframe only holds types that can be saved without pickling."""
+    return (isinstance(data, pd.DataFrame)
+            and isinstance(data.index, pd.DatetimeIndex) and data.index.tz is None
+            and all(isinstance(column, str) for column in data.columns)
+            and all(dtype.kind in 'iuf' for dtype in data.dtypes))
+
+
+def _compact_values(values):
+    """Return float64 values as float32 if that loses no precision, e.g. for whole numbers or
+    readings to the nearest quarter, so they take half the space on disk."""
+    if values.dtype != np.float64:
+        return values
+    compact = values.astype(np.float32)
+    if np.array_equal(compact, values, equal_nan=True):
+        return compact
+    return values
+
+
+def store(key, data, max_bytes=MAX_CACHE_BYTES):
+    """Save a dataframe, or a dictionary of name -> dataframe, of measurement
+    data to the cache.
+
+    Only frames with a datetime index, string site columns and numeric values
+    can be cached; anything else is silently skipped.
+    """
+    single = not isinstance(data, dict)
+    frames = {'': data} if single else data
+    if not all(isinstance(name, str) and _cacheable(frame) for name, frame in frames.items()):
+        return
+
+    arrays = {'single': np.array(single), 'names': np.array(list(frames), dtype=str)}
+    for i, frame in enumerate(frames.values()):
+        values = frame.to_numpy()
+        arrays[f'values_{i}'] = _compact_values(values)
+        arrays[f'dtype_{i}'] = np.array(values.dtype.str)
+        arrays[f'index_{i}'] = frame.index.values
+        arrays[f'columns_{i}'] = np.array(frame.columns, dtype=str)
+
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first so concurrent readers never see a partial entry
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            np.savez(temp_file, **arrays)
+        os.replace(temp_path, os.path.join(directory, key + '.npz'))
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+
+    evict(max_bytes)
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    directory = cache_dir()
+    entries = []
+    for name in os.listdir(directory):
+        if _is_entry(name):
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def _select(data, filters):
+    """Apply a reader's date and site filters to a dataframe, or a dictionary of dataframes."""
+    if all(value is None for value in filters.values()):
+        return data
+    # Imported here as the models module imports this one
+    from catchment.models import select_frame
+    if isinstance(data, dict):
+        return {name: select_frame(frame, **filters) for name, frame in data.items()}
+    return select_frame(data, **filters)
+
+
+def cached(reader):
+    """Decorate a file reader so its results are kept in the on-disk cache.
+
+    The reader's first argument must be the filename; its other arguments are
+    part of the cache key, except for the start, end and sites filters, which
+    are applied to the cached data of the whole file, and tuning arguments
+    such as buffer_size, which give the same data whatever their value.
+    """
+    signature = inspect.signature(reader)
+
+    @functools.wraps(reader)
+    def cached_reader(filename, *args, **kwargs):
+        if not _enabled:
+            return reader(filename, *args, **kwargs)
+
+        arguments = signature.bind(filename, *args, **kwargs)
+        arguments.apply_defaults()
+        other_arguments = dict(arguments.arguments)
+        del other_arguments[next(iter(signature.parameters))]
+
+        # The whole file is cached, and any filters are applied to the cached
+        # data, so a file is parsed once whatever dates and sites are asked of it
+        filters = {name: other_arguments.pop(name) for name in FILTERS if name in other_arguments}
+
+        tuning = {name: other_arguments.pop(name) for name in TUNING if name in other_arguments}
+
+        key = cache_key(reader.__name__, filename, other_arguments)
+        with instrument.stage('cache_load', filename):
+            data = load(key)
+        if data is None:
+            data = reader(filename, **other_arguments, **tuning)
+            store(key, data)
+        return _select(data, filters)
+
+    return cached_reader
@@ -1,53 +1,265 @@
 """Module containing mechanism for calculating standard deviation between datasets.
 """
 
+import abc
+import functools
 import glob
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 
-from catchment import models, views
+from catchment import cache, instrument, models, quality, store
 
 
-class CSVDataSource:
-    def __init__(self, dir_path):
+class _FileDataSource(abc.ABC):
+    """Common loading behaviour for data sources made of one file per month.
+
+    Files are read one after another unless more than one worker is asked for,
+    in which case they are read by a pool of processes (or threads). Only the
+    readings between start and end (inclusive) for the given sites are kept,
+    and they are filtered while each file is parsed.
+    """
+    file_pattern = None
+    file_type = None
+
+    def __init__(self, dir_path, workers=1, executor='process', start=None, end=None, sites=None):
+        if executor not in ('process', 'thread'):
+            raise ValueError(f'Unsupported executor: {executor}')
         self.dir_path = dir_path
+        self.workers = workers
+        self.executor = executor
+        self.start = start
+        self.end = end
+        self.sites = sites
 
-    def load_catchment_data(self):
-        data_file_paths = glob.glob(os.path.join(self.dir_path, 'rain_data_2015*.csv'))
+    @abc.abstractmethod
+    def read_file(self, path):
+        """Read one data file into a 2D Pandas data frame, applying the date and site filters."""
+
+    def find_files(self):
+        data_file_paths = sorted(glob.glob(os.path.join(self.dir_path, self.file_pattern)))
         if len(data_file_paths) == 0:
-            raise ValueError('No CSV files found in data directory')
-        data = map(models.read_variable_from_csv, data_file_paths)
+            raise ValueError(f'No {self.file_type} files found in data directory')
+        return data_file_paths
+
+    def load_catchment_data(self):
+        """Read every data file, yielding the datasets in file name order.
+
+        Each dataset is yielded as soon as it and all the files before it are
+        read, so callers can start on the first files while the rest load.
+        """
+        return self._load_in_order(self.find_files())
+
+    def iter_completed(self):
+        """Read every data file, yielding (path, dataset) pairs as each one finishes."""
+        return self._load_as_completed(self.find_files())
+
+    def _make_executor(self):
+        if self.executor == 'thread':
+            return ThreadPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _load_in_order(self, paths):
+        if self.workers <= 1:
+            yield from map(self.read_file, paths)
+            return
+        with self._make_executor() as executor:
+            yield from executor.map(self.read_file, paths)
+
+    def _load_as_completed(self, paths):
+        if self.workers <= 1:
+            for path in paths:
+                yield path, self.read_file(path)
+            return
+        with self._make_executor() as executor:
+            futures = {executor.submit(self.read_file, path): path for path in paths}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
 
-        return data
 
+class CSVDataSource(_FileDataSource):
+    """Data source reading the monthly CSV files of a directory.
 
-class JSONDataSource:
-    def __init__(self, dir_path):
+    If quality checks are given (e.g. quality.RAIN_CHECKS), each file's
+    readings are checked as it is read, and only the cleaned data is kept.
+    """
+    file_pattern = 'rain_data_2015*.csv'
+    file_type = 'CSV'
+
+    def __init__(self, dir_path, workers=1, executor='process', start=None, end=None, sites=None, checks=None):
+        super().__init__(dir_path, workers, executor, start, end, sites)
+        self.checks = checks
+
+    def read_file(self, path):
+        if self.checks is not None:
+            cleaned, _, _ = quality.read_checked_csv(path, start=self.start, end=self.end, sites=self.sites,
+                                                     **self.checks)
+            return cleaned
+        return models.read_variable_from_csv(path, start=self.start, end=self.end, sites=self.sites)
+
+
+class JSONDataSource(_FileDataSource):
+    file_pattern = 'rain_data_2015*.json'
+    file_type = 'JSON'
+
+    def read_file(self, path):
+        return models.read_variable_from_json(path, start=self.start, end=self.end, sites=self.sites)
+
+
+class MemmapDataSource:
+    """Data source reading catchment data from a memory-mapped store.
+
+    Yields one dataset per data file converted into the store, in the same
+    order, as CSVDataSource and JSONDataSource do. Date and site filters
+    become slices of the memory-mapped arrays, so other data is never read.
+    """
+    def __init__(self, dir_path, measurement='Rainfall (mm)', start=None, end=None, sites=None):
         self.dir_path = dir_path
+        self.measurement = measurement
+        self.start = start
+        self.end = end
+        self.sites = sites
 
     def load_catchment_data(self):
-        data_file_paths = glob.glob(os.path.join(self.dir_path, 'rain_data_2015*.json'))
-        if len(data_file_paths) == 0:
-            raise ValueError('No JSON files found in data directory')
-        data = map(models.read_variable_from_json, data_file_paths)
+        data_store = store.MemmapStore(self.dir_path)
+        if len(data_store.segments) == 0:
+            raise ValueError('No data found in memory-mapped store')
+        return (self._read_segment(data_store, i) for i in range(len(data_store.segments)))
 
-        return data
+    def _read_segment(self, data_store, segment):
+        sites = data_store.segments[segment]['sites']
+        if self.sites is not None:
+            wanted = set(self.sites)
+            sites = [site for site in sites if site in wanted]
+        return data_store.read(self.measurement, sites, self.start, self.end, segment)
 
 
-def daily_std(data):
+def summarise_file(filename, measurements=('Rainfall (mm)',), stats=('sum', 'mean', 'max', 'min'),
+                   start=None, end=None, sites=None):
+    """Read measurements from a CSV file and calculate their daily statistics.
+
+    :param filename: Filename of the CSV to read
+    :param measurements: Names of the measurements to read
+    :param stats: Names of the daily statistics to calculate, as for models.daily_summary
+    :returns: Dictionary of measurement name -> dictionary of statistic name -> 2D Pandas data frame
+    """
+    with instrument.stage('summarise_file', filename):
+        measurement_data = models.read_variables_from_csv(filename, measurements, start=start, end=end, sites=sites)
+        return {measurement: models.daily_summary(measurement_data[measurement], stats)
+                for measurement in measurements}
+
+
+def _timed_summary(filename, profile=False, trace_memory=False, use_cache=True, **kwargs):
+    """Summarise a file, returning (summary, error, seconds, instrumented stages) rather than raising.
+
+    The stages are returned rather than kept, so those of a worker process can
+    be sent back to the main one. The error is returned as a message, since
+    not every exception can be pickled to send it back. The instrumentation
+    and cache settings are passed in, as worker processes that are spawned
+    rather than forked start with their defaults.
+    """
+    instrument.set_enabled(profile, trace_memory)
+    cache.set_enabled(use_cache)
+    recorded = len(instrument.records())
+    started = time.perf_counter()
+    try:
+        summary, error = summarise_file(filename, **kwargs), None
+    except Exception as exc:
+        summary, error = None, f'{type(exc).__name__}: {exc}'
+    seconds = time.perf_counter() - started
+
+    return summary, error, seconds, instrument.pop_records(recorded)
+
+
+def summarise_files(filenames, measurements=('Rainfall (mm)',), stats=('sum', 'mean', 'max', 'min'), workers=1,
+                    start=None, end=None, sites=None):
+    """Summarise several CSV files, using a pool of worker processes.
+
+    Results are yielded in the order of filenames, each as soon as it and all
+    the files before it are done. A file that cannot be read or summarised
+    does not stop the others: its error message is yielded in place of the summary.
+
+    :param filenames: Filenames of the CSVs to read
+    :param workers: Number of worker processes, or 1 to work in this process
+    :returns: Iterator of (filename, summary, error, seconds) tuples, where summary
+              is as returned by summarise_file, or None if error is a message
+              naming the exception raised, e.g. 'FileNotFoundError: ...'
+    """
+    summarise = functools.partial(_timed_summary, profile=instrument.is_enabled(),
+                                  trace_memory=instrument.is_tracing_memory(), use_cache=cache.is_enabled(),
+                                  measurements=tuple(measurements), stats=tuple(stats), start=start, end=end,
+                                  sites=sites)
+    if workers <= 1:
+        results = map(summarise, filenames)
+        for filename, (summary, error, seconds, stages) in zip(filenames, results):
+            instrument.add_records(stages)
+            yield filename, summary, error, seconds
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for filename, (summary, error, seconds, stages) in zip(filenames, executor.map(summarise, filenames)):
+            instrument.add_records(stages)
+            yield filename, summary, error, seconds
+
+
+NAN_POLICIES = ('propagate', 'zero', 'raise')
+
+
+def daily_std(data, ddof=1):
     """Calculate the standard deviation by day of a 2D data array"""
-    return data.groupby(data.index.date).std()
+    return models.daily_summary(data, ['std'], ddof)['std']
+
+
+def compute_standard_deviation_by_day(data_list, ddof=1, nan_policy='propagate'):
+    """Calculate the standard deviation by day of each of several 2D data arrays.
+
+    Each dataset is reduced by day as soon as it arrives, so only one dataset
+    is held in memory at a time, and the much smaller daily results are
+    aligned on the sites of all the datasets at the end.
+
+    :param data_list: Iterable of 2D Pandas data frames with measurement data
+    :param ddof: Delta degrees of freedom of the standard deviation
+    :param nan_policy: What to do where a site has too few readings on a day to
+                       give a standard deviation: 'propagate' leaves NaN,
+                       'zero' gives 0.0 and 'raise' raises a ValueError
+    :returns: A 2D Pandas data frame with one row per day of each dataset, in
+              order, and a column for every site in any dataset
+    """
+    if nan_policy not in NAN_POLICIES:
+        raise ValueError(f'Unsupported NaN policy: {nan_policy}')
+
+    reduced = []
+    sites = pd.Index([])
+    for data in data_list:
+        days, results = models.binned_reduce(data.to_numpy(dtype=float), models.day_bins(data.index), ['std'], ddof)
+        reduced.append((days, results['std'], data.columns))
+        sites = sites.union(data.columns, sort=False)
+    if len(reduced) == 0:
+        raise ValueError('No datasets to calculate the standard deviation of')
 
+    # Days of different datasets are kept apart, as they would be by concatenating
+    standard_deviations = np.full((sum(len(days) for days, _, _ in reduced), len(sites)), np.nan)
+    all_days = np.empty(len(standard_deviations), dtype=np.int64)
+    start = 0
+    for days, results, columns in reduced:
+        stop = start + len(days)
+        standard_deviations[start:stop, sites.get_indexer(columns)] = results
+        all_days[start:stop] = days
+        start = stop
 
-def compute_standard_deviation_by_day(data_list):
-    daily_std_list = map(daily_std, data_list)
+    index = pd.Index(all_days.astype('datetime64[D]').astype(object))
+    daily_standard_deviation = pd.DataFrame(standard_deviations, index=index, columns=sites)
 
-    daily_standard_deviation = pd.concat(daily_std_list)
+    if nan_policy == 'zero':
+        daily_standard_deviation = daily_standard_deviation.fillna(0.0)
+    elif nan_policy == 'raise' and daily_standard_deviation.isna().any(axis=None):
+        raise ValueError('Standard deviation is undefined for some sites and days')
 
     return daily_standard_deviation
 
 
-def analyse_data(data_source):
+def analyse_data(data_source, ddof=1, nan_policy='propagate'):
     """Calculate the standard deviation by day between datasets.
 
     Gets all the measurement data from the CSV files in the data directory,
@@ -55,7 +267,7 @@ def analyse_data(data_source):
     of these means.
     """
     data = data_source.load_catchment_data()
-    return compute_standard_deviation_by_day(data)
+    return compute_standard_deviation_by_day(data, ddof, nan_policy)
 
     # graph_data = {
     #     'standard deviation by day': daily_standard_deviation,
@@ -0,0 +1,175 @@
+"""Module containing lagged cross-correlation of rainfall and river data.
+
+River levels (or conductivity) respond to rain after a delay that depends on
+the catchment. For every pair of a rain gauge and a river site, the
+correlation of the rain at time t with the river at time t + lag is calculated
+over a range of lags, and the lag with the highest correlation is taken as the
+response time of the river to that gauge.
+
+Both datasets are put on the same regular 15 minute grid and each site is
+standardised to zero mean and unit variance. The correlations at every lag of
+every pair are then found together with FFTs: each site's series is
+transformed once, and the transforms of a batch of gauges are multiplied with
+those of every river site and transformed back. Missing readings count as
+zero, and each correlation is divided by the number of readings the two
+series share at that lag, worked out in the same way from masks of the
+readings present.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_STEP = '15min'
+
+# Memory to use for the cross spectra of one batch of rain gauges
+BATCH_BYTES = 64 * 1024 ** 2
+
+
+def _fft_length(length):
+    """Return the smallest number at least length with no prime factors but 2, 3 and 5, which FFTs handle quickly."""
+    best = 1
+    while best < length:
+        best *= 2
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            candidate = power35
+            while candidate < length:
+                candidate *= 2
+            best = min(best, candidate)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def to_grid(data, start, periods, step=DEFAULT_STEP):
+    """Place measurement data on a regular grid of times, with NaN where there is no reading.
+
+    :param data: A 2D Pandas data frame with measurement data
+    :param start: First time of the grid
+    :param periods: Number of times in the grid
+    :param step: Interval between the times of the grid
+    :returns: A 2D NumPy array with one row per grid time and one column per site
+    """
+    step_ns = pd.Timedelta(step).value
+    times = pd.DatetimeIndex(data.index).values.astype('datetime64[ns]').astype(np.int64)
+    offsets = times - pd.Timestamp(start).value
+    rows = offsets // step_ns
+    # Readings between grid times, or outside the grid, are left out
+    keep = (offsets % step_ns == 0) & (rows >= 0) & (rows < periods)
+
+    grid = np.full((periods, data.shape[1]), np.nan)
+    grid[rows[keep]] = data.to_numpy(dtype=float)[keep]
+    return grid
+
+
+def _standardise(values):
+    """Scale each column to zero mean and unit variance over the readings present, with missing readings as zero."""
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        standardised = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+    # A site with no readings, or no variation, cannot be correlated
+    standardised[:, ~np.isfinite(standardised).any(axis=0)] = np.nan
+    present &= ~np.isnan(standardised)
+    return np.where(present, standardised, 0.0), present.astype(float)
+
+
+def _correlate(rain, river, lags, fft_length):
+    """Sum the products of rain[t] and river[t + lag] over t, for every lag and every pair of columns.
+
+    :returns: A 3D array indexed by [lag, rain column, river column]
+    """
+    rain_spectra = np.conj(np.fft.rfft(rain, fft_length, axis=0))
+    river_spectra = np.fft.rfft(river, fft_length, axis=0)
+
+    # Negative lags wrap around to the end of the circular correlation
+    positions = np.asarray(lags) % fft_length
+    sums = np.empty((len(lags), rain.shape[1], river.shape[1]))
+    batch = max(1, BATCH_BYTES // (rain_spectra.shape[0] * max(river.shape[1], 1) * 16))
+    for first in range(0, rain.shape[1], batch):
+        cross_spectra = rain_spectra[:, first:first + batch, np.newaxis] * river_spectra[:, np.newaxis, :]
+        sums[:, first:first + batch] = np.fft.irfft(cross_spectra, fft_length, axis=0)[positions]
+    return sums
+
+
+def lag_correlation(rain, river, max_lag='2D', min_lag='0min', step=DEFAULT_STEP, min_overlap=96):
+    """Calculate the correlation of every rain gauge with every river site at each lag.
+
+    :param rain: A 2D Pandas data frame of rainfall, one column per gauge
+    :param river: A 2D Pandas data frame of a river measurement, one column per site
+    :param max_lag: Longest time after the rain to look for a response in the river
+    :param min_lag: Shortest lag to try; negative lags have the river lead the rain
+    :param step: Interval of the regular grid the data is placed on
+    :param min_overlap: Fewest readings the two series must share at a lag for
+                        it to have a correlation (96 is a day of 15 minute readings)
+    :returns: Tuple of (TimedeltaIndex of lags, 3D NumPy array of correlations
+              indexed by [lag, rain gauge, river site])
+    """
+    step_ns = pd.Timedelta(step).value
+    lags = np.arange(pd.Timedelta(min_lag).value // step_ns, pd.Timedelta(max_lag).value // step_ns + 1)
+
+    start = min(rain.index.min(), river.index.min())
+    end = max(rain.index.max(), river.index.max())
+    periods = (end - start).value // step_ns + 1
+    rain_values, rain_present = _standardise(to_grid(rain, start, periods, step))
+    river_values, river_present = _standardise(to_grid(river, start, periods, step))
+
+    fft_length = _fft_length(periods + int(np.abs(lags).max()))
+    sums = _correlate(rain_values, river_values, lags, fft_length)
+    overlap = np.rint(_correlate(rain_present, river_present, lags, fft_length))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = sums / overlap
+    correlation[overlap < max(min_overlap, 1)] = np.nan
+    return pd.to_timedelta(lags * step_ns), correlation
+
+
+def peak_lags(rain, river, max_lag='2D', min_lag='0min', step=DEFAULT_STEP, min_overlap=96, site_catchment=None):
+    """Find the lag at which each river site is most correlated with each rain gauge.
+
+    :param rain: A 2D Pandas data frame of rainfall, one column per gauge
+    :param river: A 2D Pandas data frame of a river measurement, one column per site
+    :param max_lag: Longest time after the rain to look for a response in the river
+    :param min_lag: Shortest lag to try; negative lags have the river lead the rain
+    :param step: Interval of the regular grid the data is placed on
+    :param min_overlap: Fewest readings the two series must share at a lag for it to count
+    :param site_catchment: Pandas series of catchment name indexed by site code,
+                           e.g. from spatial.site_catchments. If given, only
+                           gauges and river sites in the same catchment are paired.
+    :returns: Pandas data frame indexed by (rain site, river site), with the
+              'lag' of the highest 'correlation', and that correlation
+    """
+    if site_catchment is None:
+        groups = [(list(rain.columns), list(river.columns))]
+    else:
+        rain_catchments = site_catchment.reindex(rain.columns)
+        river_catchments = site_catchment.reindex(river.columns)
+        groups = [(list(rain.columns[(rain_catchments == catchment).to_numpy()]),
+                   list(river.columns[(river_catchments == catchment).to_numpy()]))
+                  for catchment in pd.unique(rain_catchments.dropna())]
+
+    pieces = []
+    for rain_sites, river_sites in groups:
+        if len(rain_sites) == 0 or len(river_sites) == 0:
+            continue
+        lags, correlation = lag_correlation(rain[rain_sites], river[river_sites], max_lag, min_lag, step,
+                                            min_overlap)
+        # Pairs with no correlation at any lag are reported as NaN
+        found = ~np.isnan(correlation).all(axis=0)
+        best = np.argmax(np.where(np.isnan(correlation), -np.inf, correlation), axis=0)
+        peak = np.take_along_axis(correlation, best[np.newaxis], axis=0)[0]
+        peak_lag = lags.values[best]
+        peak_lag[~found] = np.timedelta64('NaT')
+        pieces.append(pd.DataFrame({
+            'rain_site': np.repeat(np.asarray(rain_sites, dtype=object), len(river_sites)),
+            'river_site': np.tile(np.asarray(river_sites, dtype=object), len(rain_sites)),
+            'lag': peak_lag.ravel(),
+            'correlation': peak.ravel(),
+        }))
+
+    if len(pieces) == 0:
+        return pd.DataFrame({'lag': pd.to_timedelta([]), 'correlation': np.empty(0)},
+                            index=pd.MultiIndex.from_arrays([[], []], names=['rain_site', 'river_site']))
+    return pd.concat(pieces, ignore_index=True).set_index(['rain_site', 'river_site'])
@@ -0,0 +1,209 @@
+"""Module containing a lazily evaluated view of catchment data.
+
+A Dataset records the operations asked of it - selecting a measurement,
+filtering sites and dates, resampling, aggregating and normalising - without
+doing any work. When the result is requested with compute(), the operations
+are planned together:
+
+- site and date filters are passed to the file readers, so unwanted rows are
+  dropped while parsing
+- a resample followed by an aggregate becomes a single pass over the data
+  computing every requested statistic at once
+- loaded data and computed statistics are memoized, and shared with every
+  Dataset derived from the same one, so asking again (or asking for a subset
+  of data already loaded) does not re-read or recompute anything
+
+For example:
+
+    rain = Dataset(['data/rain_data_2015-12.csv'])
+    week = rain.filter_dates('2005-12-01', '2005-12-07').filter_sites(['FP35'])
+    week.resample('D').aggregate('sum', 'max').compute()
+"""
+
+import os
+import re
+
+import pandas as pd
+
+from catchment import models
+
+
+READERS = {
+    '.csv': models.read_variable_from_csv,
+    '.json': models.read_variable_from_json,
+    '.xml': models.read_variable_from_xml,
+}
+
+
+def _summarise(data, period, stats):
+    """Calculate statistics per period, with days indexed by date as models.daily_summary gives them."""
+    if period == 'D':
+        return models.daily_summary(data, stats)
+    return models.resample_summary(data, period, stats)
+
+
+class Dataset:
+    """A lazily evaluated query over catchment data files or a dataframe."""
+
+    def __init__(self, source, measurement='Rainfall (mm)', start=None, end=None, sites=None, steps=(),
+                 memo=None):
+        """
+        :param source: Filename, or list of filenames, of data files to read.
+                       A 2D Pandas data frame of already loaded data may be given instead.
+        :param measurement: Name of the measurement to read from the files
+        """
+        if isinstance(source, (str, os.PathLike)):
+            source = [source]
+        self.source = source
+        self.measurement = measurement
+        self.start = start
+        self.end = end
+        self.sites = None if sites is None else tuple(sites)
+        self.steps = tuple(steps)
+        self.memo = {} if memo is None else memo
+
+    def _derive(self, **changes):
+        arguments = {'source': self.source, 'measurement': self.measurement, 'start': self.start,
+                     'end': self.end, 'sites': self.sites, 'steps': self.steps, 'memo': self.memo}
+        arguments.update(changes)
+        return Dataset(**arguments)
+
+    def select(self, measurement):
+        """Choose the measurement to read from the data files."""
+        return self._derive(measurement=measurement)
+
+    def filter_sites(self, sites):
+        """Keep only the given sites (within any already chosen)."""
+        if self.sites is not None:
+            wanted = set(sites)
+            sites = [site for site in self.sites if site in wanted]
+        return self._derive(sites=sites)
+
+    def filter_dates(self, start=None, end=None):
+        """Keep only readings taken between start and end, inclusive (within any range already chosen)."""
+        if start is None or (self.start is not None and models.parse_bound(self.start) > models.parse_bound(start)):
+            start = self.start
+        if end is None or (self.end is not None
+                           and models.parse_bound(self.end, end=True) < models.parse_bound(end, end=True)):
+            end = self.end
+        return self._derive(start=start, end=end)
+
+    def resample(self, period='D'):
+        """Group readings into periods of time, e.g. 'h', '6h', 'D', 'W' or 'MS' (see models.period_bins)."""
+        # Check the period now rather than when computing
+        models.period_bins(pd.DatetimeIndex([]), period)
+        return self._derive(steps=self.steps + (('resample', period),))
+
+    def rolling(self, window, *stats):
+        """Calculate statistics over a sliding window ending at each reading, e.g. rolling('24h', 'sum')."""
+        return self._derive(steps=self.steps + (('rolling', window, tuple(stats) or ('sum',)),))
+
+    def aggregate(self, *stats):
+        """Reduce each resampled period to the named statistics, e.g. 'sum' and 'max'."""
+        if len(self.steps) == 0 or self.steps[-1][0] != 'resample':
+            raise ValueError('aggregate must directly follow resample')
+        return self._derive(steps=self.steps + (('aggregate', tuple(stats)),))
+
+    def normalise(self, mode='max'):
+        """Scale each site's values, by their maximum unless another mode of models.data_normalise is given."""
+        return self._derive(steps=self.steps + (('normalise', mode),))
+
+    def _source_key(self):
+        if isinstance(self.source, pd.DataFrame):
+            return ('frame', id(self.source))
+        return ('files', tuple(os.fspath(filename) for filename in self.source), self.measurement)
+
+    def _load(self):
+        """Read the source data, reusing memoized data where possible."""
+        key = ('load', self._source_key(), self.start, self.end, self.sites)
+        if key in self.memo:
+            return self.memo[key]
+
+        unfiltered = self.memo.get(('load', self._source_key(), None, None, None))
+        if isinstance(self.source, pd.DataFrame):
+            unfiltered = self.source
+
+        if unfiltered is not None:
+            # Filtered as the readers filter, so warm and cold loads give the same rows
+            data = models.select_frame(unfiltered, self.start, self.end, self.sites)
+        else:
+            frames = []
+            for filename in self.source:
+                _, extension = os.path.splitext(filename)
+                if extension not in READERS:
+                    raise ValueError(f'Unsupported file format: {extension}')
+                measurement = self.measurement
+                if extension == '.xml':
+                    # XML element names cannot hold spaces or brackets, e.g. Rainfall (mm) -> Rainfall_mm
+                    measurement = re.sub(r'\W+', '_', measurement).strip('_')
+                frames.append(READERS[extension](filename, measurement, start=self.start, end=self.end,
+                                                 sites=self.sites))
+            data = frames[0] if len(frames) == 1 else pd.concat(frames).sort_index()
+
+        self.memo[key] = data
+        return data
+
+    def _aggregate(self, period, stats):
+        """Calculate statistics per period, computing all those not yet memoized in one pass."""
+        base = ('aggregate', self._source_key(), self.start, self.end, self.sites, period)
+        missing = [stat for stat in stats if base + (stat,) not in self.memo]
+        if missing:
+            for stat, result in _summarise(self._load(), period, missing).items():
+                self.memo[base + (stat,)] = result
+        return {stat: self.memo[base + (stat,)] for stat in stats}
+
+    def explain(self):
+        """Describe the plan compute() will follow, one step per line."""
+        lines = []
+        if isinstance(self.source, pd.DataFrame):
+            lines.append('slice loaded dataframe')
+        else:
+            lines.append(f'read {self.measurement} from {len(self.source)} file(s)')
+        if self.start is not None or self.end is not None:
+            lines.append(f'  pushed down: dates {self.start} to {self.end}')
+        if self.sites is not None:
+            lines.append(f"  pushed down: sites {', '.join(self.sites)}")
+        steps = list(self.steps)
+        while steps:
+            step = steps.pop(0)
+            if step[0] == 'resample' and steps and steps[0][0] == 'aggregate':
+                lines.append(f"resample {step[1]} and aggregate {', '.join(steps.pop(0)[1])} in one pass")
+            elif step[0] == 'resample':
+                lines.append(f'resample {step[1]} and aggregate mean in one pass')
+            elif step[0] == 'rolling':
+                lines.append(f"rolling {step[1]} window {', '.join(step[2])}")
+            else:
+                lines.append(' '.join(step))
+        return '\n'.join(lines)
+
+    def compute(self):
+        """Run the planned operations.
+
+        :returns: A 2D Pandas data frame, or a dictionary of statistic name ->
+                  data frame if several statistics were aggregated
+        """
+        loaded = self._load()
+        data = loaded
+        steps = list(self.steps)
+        while steps:
+            step = steps.pop(0)
+            if step[0] == 'resample':
+                if isinstance(data, dict):
+                    raise ValueError('Cannot resample several aggregated statistics at once')
+                stats = steps.pop(0)[1] if steps and steps[0][0] == 'aggregate' else ('mean',)
+                if data is loaded:
+                    results = self._aggregate(step[1], stats)
+                else:
+                    results = _summarise(data, step[1], stats)
+                data = results[stats[0]] if len(stats) == 1 else results
+            elif step[0] == 'rolling':
+                if isinstance(data, dict):
+                    raise ValueError('Cannot calculate rolling windows of several aggregated statistics at once')
+                results = models.rolling_summary(data, step[1], step[2])
+                data = results[step[2][0]] if len(step[2]) == 1 else results
+            elif step[0] == 'normalise':
+                if isinstance(data, dict):
+                    data = {stat: models.data_normalise(frame, step[1]) for stat, frame in data.items()}
+                else:
+                    data = models.data_normalise(data, step[1])
+        return data
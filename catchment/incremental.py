@@ -0,0 +1,212 @@
+"""Module containing incremental calculation of daily statistics.
+
+Loggers deliver new readings every day, and recalculating the daily statistics
+over the full history each time costs more as the history grows. A
+DailyAccumulator instead keeps running per-site, per-day totals (count, sum,
+mean and sum of squared deviations, maximum and minimum) which can be saved to
+disk. New readings are reduced to the same totals and merged in, so only the
+days they touch are updated. Means and variances are merged with the
+parallel form of Welford's algorithm, which stays numerically stable however
+the readings of a day are split between updates.
+"""
+
+import io
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from catchment import models
+
+
+_FIELDS = ('count', 'sum', 'mean', 'm2', 'max', 'min')
+
+
+def _blank_totals(field, shape):
+    """Return an array of totals for days and sites with no readings yet."""
+    if field in ('max', 'min'):
+        return np.full(shape, np.nan)
+    return np.zeros(shape, dtype=np.int64 if field == 'count' else float)
+
+
+class DailyAccumulator:
+    """Running per-site, per-day totals from which daily statistics are calculated.
+
+    The totals are held in arrays with room to spare, which double in size
+    whenever they fill up, so adding new days costs time in proportion to the
+    new days rather than to the whole history.
+    """
+
+    def __init__(self):
+        self._days = np.empty(0, dtype=np.int64)
+        self._num_days = 0
+        self.sites = []
+        self._totals = {field: _blank_totals(field, (0, 0)) for field in _FIELDS}
+        # Bytes of each CSV file already ingested by update_from_csv
+        self.offsets = {}
+
+    @property
+    def days(self):
+        """Days with totals, as sorted int64 days since the epoch."""
+        return self._days[:self._num_days]
+
+    @property
+    def totals(self):
+        """Dictionary of field -> 2D array of totals, one row per day and one column per site."""
+        return {field: values[:self._num_days, :len(self.sites)] for field, values in self._totals.items()}
+
+    @classmethod
+    def load(cls, filename):
+        """Load accumulated totals saved by save, or start afresh if the file does not exist."""
+        accumulator = cls()
+        if not os.path.exists(filename):
+            return accumulator
+        with np.load(filename, allow_pickle=False) as saved:
+            accumulator._days = saved['days']
+            accumulator._num_days = len(accumulator._days)
+            accumulator.sites = list(saved['sites'])
+            accumulator._totals = {field: saved[field] for field in _FIELDS}
+            accumulator.offsets = dict(zip(saved['offset_files'], saved['offset_positions'].tolist()))
+        return accumulator
+
+    def save(self, filename):
+        """Save the accumulated totals to a NumPy .npz file."""
+        with open(filename, 'wb') as saved:
+            np.savez(saved, days=self.days, sites=np.array(self.sites, dtype=str),
+                     offset_files=np.array(list(self.offsets), dtype=str),
+                     offset_positions=np.array(list(self.offsets.values()), dtype=np.int64),
+                     **self.totals)
+
+    def _resize(self, num_days, num_sites, rows):
+        """Move the totals into new arrays with room for at least num_days and num_sites.
+
+        :param rows: Row of the new arrays that each existing day moves to
+        """
+        # Each dimension doubles only once it is full
+        shape = tuple(size if needed <= size else max(needed, 2 * size)
+                      for needed, size in zip((num_days, num_sites), self._totals['count'].shape))
+        for field in _FIELDS:
+            resized = _blank_totals(field, shape)
+            resized[rows, :len(self.sites)] = self.totals[field]
+            self._totals[field] = resized
+
+        days = np.zeros(shape[0], dtype=np.int64)
+        days[rows] = self.days
+        self._days = days
+
+    def _expand(self, days, sites):
+        """Add rows for any new days and columns for any new sites to the totals.
+
+        :param days: Sorted, distinct int64 days since the epoch
+        :param sites: Site IDs
+        """
+        known_sites = set(self.sites)
+        new_sites = [site for site in sites if site not in known_sites]
+        positions = np.searchsorted(self.days, days)
+        known = positions < self._num_days
+        known[known] = self.days[positions[known]] == days[known]
+        new_days = days[~known]
+        if len(new_sites) == 0 and len(new_days) == 0:
+            return
+
+        num_days = self._num_days + len(new_days)
+        num_sites = len(self.sites) + len(new_sites)
+        if len(new_days) > 0 and self._num_days > 0 and new_days[0] < self.days[-1]:
+            # Days earlier than the last one have to be slotted in between, moving the whole history
+            all_days = np.union1d(self.days, new_days)
+            self._resize(num_days, num_sites, np.searchsorted(all_days, self.days))
+            self._days[:num_days] = all_days
+        else:
+            capacity = self._totals['count'].shape
+            if num_days > capacity[0] or num_sites > capacity[1]:
+                self._resize(num_days, num_sites, np.arange(self._num_days))
+            self._days[self._num_days:num_days] = new_days
+
+        self._num_days = num_days
+        self.sites = self.sites + new_sites
+
+    def update(self, data):
+        """Merge newly arrived readings into the daily totals.
+
+        :param data: A 2D Pandas data frame with measurement data.
+        Index must be np.datetime64 compatible format. Columns are measurement sites.
+        """
+        if len(data) == 0:
+            return
+        days, new = models.binned_reduce(data.to_numpy(dtype=float), models.day_bins(data.index),
+                                         ['count', 'sum', 'mean', 'std', 'max', 'min'], ddof=0)
+        new_count = new['count']
+        new_mean = np.where(new_count > 0, new['mean'], 0.0)
+        new_m2 = np.where(new_count > 0, new['std'] ** 2 * new_count, 0.0)
+
+        self._expand(days, list(data.columns))
+        site_positions = {site: i for i, site in enumerate(self.sites)}
+        rows = np.searchsorted(self.days, days)[:, np.newaxis]
+        columns = np.array([site_positions[site] for site in data.columns])[np.newaxis, :]
+
+        count = self._totals['count'][rows, columns]
+        mean = self._totals['mean'][rows, columns]
+        merged_count = count + new_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = new_mean - mean
+            weight = np.where(merged_count > 0, new_count / merged_count, 0.0)
+            self._totals['mean'][rows, columns] = mean + delta * weight
+            self._totals['m2'][rows, columns] += new_m2 + delta ** 2 * count * weight
+        self._totals['count'][rows, columns] = merged_count
+        self._totals['sum'][rows, columns] += new['sum']
+        self._totals['max'][rows, columns] = np.fmax(self._totals['max'][rows, columns], new['max'])
+        self._totals['min'][rows, columns] = np.fmin(self._totals['min'][rows, columns], new['min'])
+
+    def update_from_csv(self, filename, measurements='Rainfall (mm)', date_format=None):
+        """Ingest only the rows appended to a CSV data file since it was last read.
+
+        Only complete lines are read, so a file being written to can be
+        ingested safely; any partial last line is picked up next time. A file
+        that has become smaller than the part already read is read again from
+        its start, with a warning.
+
+        :param filename: Filename of CSV to load
+        :param measurements: Name of the data column to read
+        :param date_format: strftime format of the Date column, inferred if omitted
+        """
+        key = os.path.abspath(filename)
+        offset = self.offsets.get(key, 0)
+        with open(filename, 'rb') as data_file:
+            if os.fstat(data_file.fileno()).st_size < offset:
+                # The file has been truncated or replaced, e.g. rotated by the logger
+                warnings.warn(f'{filename} is smaller than when it was last read, so is read again from its start')
+                offset = 0
+            header = data_file.readline()
+            data_file.seek(max(offset, len(header)))
+            appended = data_file.read()
+
+        complete = appended[:appended.rfind(b'\n') + 1]
+        if len(complete) > 0:
+            dataset = pd.read_csv(io.BytesIO(header + complete), usecols=['Date', 'Site', measurements])
+            dates = models.parse_dates(dataset['Date'], date_format)
+            self.update(models.long_to_wide(dates, dataset['Site'], dataset[measurements]))
+
+        self.offsets[key] = max(offset, len(header)) + len(complete)
+
+    def result(self, stat, ddof=1):
+        """Calculate a daily statistic from the accumulated totals.
+
+        :param stat: Name of the statistic, any of 'sum', 'mean', 'max', 'min', 'std' and 'count'
+        :param ddof: Delta degrees of freedom used by 'std'
+        :returns: A 2D Pandas data frame with one row per day, as given by models.daily_summary
+        """
+        count = self.totals['count']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if stat in ('sum', 'max', 'min', 'count'):
+                values = self.totals[stat].copy()
+            elif stat == 'mean':
+                values = np.where(count > 0, self.totals['mean'], np.nan)
+            elif stat == 'std':
+                dof = count - ddof
+                values = np.where(dof > 0, np.sqrt(self.totals['m2'] / np.where(dof > 0, dof, 1)), np.nan)
+            else:
+                raise ValueError(f'Unsupported daily statistic: {stat}')
+
+        index = pd.Index(self.days.astype('datetime64[D]').astype(object))
+        return pd.DataFrame(values, index=index, columns=pd.Index(self.sites, dtype=object))
@@ -0,0 +1,221 @@
+"""Module containing instrumentation of the stages of the analysis pipeline.
+
+Parts of the pipeline, such as parsing a CSV file, parsing its dates,
+reshaping it or calculating statistics, are wrapped in a stage:
+
+    with instrument.stage('read_csv', filename) as record:
+        dataset = pd.read_csv(filename)
+        record.count(len(dataset))
+
+While instrumentation is enabled, each stage records its wall time, CPU time,
+the number of rows it processed and the process's peak resident memory (and,
+optionally, the peak memory traced by tracemalloc while it ran). Stages may be
+nested, and a nested stage is attributed to the input file of the stage
+around it. When disabled, which is the default, stage() returns a shared
+object that does nothing, so the hooks cost almost nothing.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+_enabled = False
+_trace_memory = False
+_records = []
+_stack = []
+
+
+def set_enabled(enabled, trace_memory=False):
+    """Turn instrumentation on or off for the rest of this process.
+
+    :param enabled: Whether stages should be recorded
+    :param trace_memory: Also trace the peak memory allocated by each stage with
+                         tracemalloc, which slows the pipeline down considerably
+    """
+    global _enabled, _trace_memory
+    _enabled = enabled
+    if enabled and trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not (enabled and trace_memory) and _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = enabled and trace_memory
+
+
+def is_enabled():
+    return _enabled
+
+
+def is_tracing_memory():
+    return _trace_memory
+
+
+def records():
+    """Return the list of stages recorded so far, each a dictionary."""
+    return list(_records)
+
+
+def add_records(new_records):
+    """Add stages recorded elsewhere, e.g. in a worker process."""
+    _records.extend(new_records)
+
+
+def pop_records(start=0):
+    """Remove and return the stages recorded after the first start of them."""
+    popped = _records[start:]
+    del _records[start:]
+    return popped
+
+
+def clear():
+    """Forget every stage recorded so far."""
+    _records.clear()
+
+
+def count(rows):
+    """Add to the number of rows processed by the innermost stage being recorded."""
+    if _stack:
+        _stack[-1].count(rows)
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux and the BSDs kilobytes
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class _NullStage:
+    """Stands in for a stage while instrumentation is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, rows):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """A stage of the pipeline being recorded."""
+
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = filename
+        self.rows = None
+        self.traced_peak = 0
+
+    def count(self, rows):
+        """Add to the number of rows processed by the stage."""
+        self.rows = (self.rows or 0) + int(rows)
+
+    def __enter__(self):
+        if self.filename is None and _stack:
+            self.filename = _stack[-1].filename
+        if _trace_memory:
+            if _stack:
+                # Keep the peak of the stage around this one before restarting the count
+                _stack[-1].traced_peak = max(_stack[-1].traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        _stack.append(self)
+        self.started_wall = time.perf_counter()
+        self.started_cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.started_wall
+        cpu = time.process_time() - self.started_cpu
+        _stack.pop()
+
+        # The outermost stage of a file covers all the work done on it
+        outermost = self.filename is not None and (not _stack or _stack[-1].filename != self.filename)
+        record = {'stage': self.name, 'file': self.filename, 'depth': len(_stack), 'outermost': outermost,
+                  'wall': wall, 'cpu': cpu, 'rows': self.rows, 'max_rss_bytes': _max_rss_bytes()}
+        if _trace_memory:
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+            record['peak_traced_bytes'] = self.traced_peak
+            if _stack:
+                _stack[-1].traced_peak = max(_stack[-1].traced_peak, self.traced_peak)
+        if exc_info[0] is not None:
+            record['error'] = repr(exc_info[1])
+        _records.append(record)
+        return False
+
+
+def stage(name, filename=None):
+    """Record a stage of the pipeline, as a context manager.
+
+    :param name: Name of the stage, e.g. 'read_csv'
+    :param filename: Input file the stage works on, if any. Nested stages
+                     default to the file of the stage around them.
+    :returns: Context manager whose count(rows) method adds to the rows processed
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, None if filename is None else str(filename))
+
+
+def summarise(stage_records, key='stage'):
+    """Total up recorded stages by stage name (or by input file).
+
+    :param stage_records: List of recorded stages, as returned by records()
+    :param key: 'stage' to total by stage name, or 'file' to total the
+                outermost stages of each input file. The rows of a file
+                are the most processed by any one of its stages.
+    :returns: Dictionary of stage name (or file) -> dictionary of totals
+    """
+    totals = {}
+    for record in stage_records:
+        if key == 'file' and record['file'] is None:
+            continue
+        total = totals.setdefault(record[key], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0,
+                                                'max_rss_bytes': 0, 'peak_traced_bytes': None})
+        if key == 'file':
+            total['rows'] = max(total['rows'], record['rows'] or 0)
+            if not record['outermost']:
+                continue
+        else:
+            total['rows'] += record['rows'] or 0
+        total['calls'] += 1
+        total['wall'] += record['wall']
+        total['cpu'] += record['cpu']
+        total['max_rss_bytes'] = max(total['max_rss_bytes'], record['max_rss_bytes'] or 0)
+        if 'peak_traced_bytes' in record:
+            total['peak_traced_bytes'] = max(total['peak_traced_bytes'] or 0, record['peak_traced_bytes'])
+    return totals
+
+
+def format_summary(stage_records, key='stage'):
+    """Lay out the totals of the recorded stages as a table, one line per stage (or input file)."""
+    title = 'stage' if key == 'stage' else 'file'
+    width = max([len(title)] + [len(str(name)) for name in summarise(stage_records, key)])
+    lines = [f"{title:<{width}} {'calls':>6} {'wall (s)':>9} {'cpu (s)':>9} {'rows':>12} {'rows/s':>12} "
+             f"{'max RSS (MiB)':>14} {'traced (MiB)':>13}"]
+    for name, total in summarise(stage_records, key).items():
+        rate = total['rows'] / total['wall'] if total['rows'] and total['wall'] > 0 else 0
+        traced = '' if total['peak_traced_bytes'] is None else f"{total['peak_traced_bytes'] / 1024 ** 2:.1f}"
+        lines.append(f"{str(name):<{width}} {total['calls']:>6} {total['wall']:>9.3f} {total['cpu']:>9.3f} "
+                     f"{total['rows']:>12,} {rate:>12,.0f} {total['max_rss_bytes'] / 1024 ** 2:>14.1f} {traced:>13}")
+    return '\n'.join(lines)
+
+
+def write_trace(filename, stage_records):
+    """Save the recorded stages, and their totals by stage and by file, as JSON."""
+    trace = {'stages': stage_records,
+             'by_stage': summarise(stage_records, 'stage'),
+             'by_file': summarise(stage_records, 'file')}
+    with open(filename, 'w') as trace_file:
+        json.dump(trace, trace_file, indent=2)
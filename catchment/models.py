@@ -7,90 +7,889 @@ contains data for a single measurement site, and each row represents a single
 measurement time across all sites.
 """
 
+import datetime
+import json
+import os
+import re
+from xml.etree import ElementTree
+
 import pandas as pd
 import numpy as np
 
+from catchment import instrument
+from catchment.cache import cached
+
+
+ISO_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+# A date starting with a four digit year, e.g. 2005-12-01 or 2005/12/01
+YEAR_FIRST_PATTERN = re.compile(r'\s*\d{4}[-/.]')
+
+# A date with no time of day, e.g. 2005-12-01 or 01/12/2005
+DATE_ONLY_PATTERN = re.compile(r'\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\s*$')
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Characters of a JSON file read at a time while streaming its records
+JSON_READ_SIZE = 1024 ** 2
+
+# JSON files up to this size are parsed whole, which is faster; larger ones
+# are streamed a record at a time, in constant memory
+JSON_STREAM_BYTES = 256 * 1024 ** 2
+
+DAILY_STATS = ('sum', 'mean', 'max', 'min')
+
+BINNED_STATS = ('sum', 'mean', 'max', 'min', 'std', 'count')
+
+ROLLING_STATS = ('sum', 'mean', 'count')
+
+NANOSECONDS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+
+# Dates and site IDs repeat once per site and once per measurement time, so
+# they are parsed as categoricals: each distinct string is stored once, and
+# every row holds only a small integer code
+COMPACT_DTYPES = {'Date': 'category', 'Site': 'category'}
+
+
+def _compact(values):
+    """Return categorical values as they are, and anything else as a NumPy array."""
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        return values
+    return np.asarray(values)
+
+
+def parse_dates(values, date_format=None):
+    """Convert a column of date strings to datetime64 values in one vectorised call.
+
+    :param values: Sequence of date strings, e.g. a (possibly categorical) column of a pandas dataframe
+    :param date_format: strftime format of the dates. If omitted it is inferred
+                        from the first value, with day-first ordering preferred.
+    :returns: A pandas DatetimeIndex
+    """
+    with instrument.stage('parse_dates') as record:
+        # Every timestamp is repeated once per site, so only parse the distinct strings
+        codes, unique_values = pd.factorize(_compact(values), use_na_sentinel=False)
+        record.count(len(codes))
+        return _parse_unique_dates(np.asarray(unique_values, dtype=object), date_format).take(codes)
+
+
+def _parse_unique_dates(unique_values, date_format):
+    """Parse distinct date strings, inferring their format if not given."""
+    given_format = date_format
+    if date_format is None and len(unique_values) > 0 and ISO_DATE_PATTERN.match(str(unique_values[0])):
+        date_format = 'ISO8601'
+
+    try:
+        unique_dates = pd.to_datetime(unique_values, dayfirst=True, format=date_format)
+    except ValueError:
+        if given_format is not None:
+            raise
+        # Files with inconsistent date formats fall back to per-value inference
+        unique_dates = pd.to_datetime(unique_values, dayfirst=True, format='mixed')
+
+    return pd.DatetimeIndex(unique_dates)
+
+
+def long_to_wide(dates, sites, values):
+    """Reshape long (date, site, value) records into a 2D catchment data frame.
+
+    All records are placed in a single pass: dates and sites are factorised to
+    integer codes, which are then used to scatter the values into a 2D array.
+
+    :param dates: Sequence of datetime64 compatible measurement times
+    :param sites: Sequence of site IDs, one per measurement
+    :param values: Sequence of measurement values
+    :returns: A 2D Pandas data frame. Index will be sorted dates,
+              Columns will be the individual sites in order of first appearance
+    """
+    return long_to_wide_many(dates, sites, {None: values})[None]
+
+
+def long_to_wide_many(dates, sites, columns):
+    """Reshape long records holding several measurements into one 2D catchment
+    data frame per measurement, factorising the dates and sites only once.
 
+    :param dates: Sequence of datetime64 compatible measurement times
+    :param sites: Sequence of site IDs, one per measurement, which may be categorical
+    :param columns: Dictionary of measurement name -> sequence of values
+    :returns: Dictionary of measurement name -> 2D Pandas data frame, all
+              sharing the same index of sorted dates and the same sites
+    """
+    with instrument.stage('reshape') as record:
+        date_codes, unique_dates = pd.factorize(pd.DatetimeIndex(dates), sort=True)
+        site_codes, unique_sites = pd.factorize(_compact(sites))
+        index = pd.DatetimeIndex(unique_dates)
+        columns_index = pd.Index(np.asarray(unique_sites, dtype=object), dtype=object)
+
+        # Records with no site or no date are factorised to -1, and would be
+        # scattered into the last row or column, so they are dropped
+        placed = (date_codes >= 0) & (site_codes >= 0)
+        if placed.all():
+            placed = slice(None)
+        date_codes = date_codes[placed]
+        site_codes = site_codes[placed]
+
+        # Only the first record of a repeated (date, site) is kept, as quality
+        # control does; the order of a scatter onto repeated cells is undefined
+        cells = date_codes * len(unique_sites) + site_codes
+        if len(cells) and np.bincount(cells).max() > 1:
+            _, first_records = np.unique(cells, return_index=True)
+            date_codes = date_codes[first_records]
+            site_codes = site_codes[first_records]
+            placed = np.flatnonzero(placed)[first_records] if isinstance(placed, np.ndarray) else first_records
+
+        wide_frames = {}
+        for name, values in columns.items():
+            wide = np.full((len(unique_dates), len(unique_sites)), np.nan)
+            wide[date_codes, site_codes] = np.asarray(values, dtype=float)[placed]
+            wide_frames[name] = pd.DataFrame(wide, index=index, columns=columns_index)
+        record.count(len(date_codes))
+
+    return wide_frames
+
+
+def parse_bound(value, end=False):
+    """Convert the start or end of a date range to a Timestamp.
+
+    Strings starting with a four digit year are read year first (2005-12-01
+    00:15, or 2005/12/01), and others day first (01/12/2005 00:15), as in
+    the data files. An end given as a date alone
+    covers the whole of that day, as it does when slicing a frame with .loc.
+
+    :param value: Date string, date, datetime or Timestamp, or None
+    :param end: Whether the value is the end of the range
+    :returns: A pandas Timestamp, or None if value is None
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if YEAR_FIRST_PATTERN.match(value):
+            bound = pd.to_datetime(value, yearfirst=True)
+        else:
+            bound = pd.to_datetime(value, dayfirst=True)
+        whole_day = DATE_ONLY_PATTERN.match(value) is not None
+    else:
+        bound = pd.Timestamp(value)
+        whole_day = isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+    if end and whole_day:
+        bound += pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+    return bound
+
+
+def date_mask(dates, start=None, end=None):
+    """Find which measurement times fall within a (possibly open) date range.
+
+    :param dates: A pandas DatetimeIndex
+    :param start: Earliest measurement time to keep, inclusive
+    :param end: Latest measurement time to keep, inclusive; a date alone keeps the whole day
+    :returns: A boolean NumPy array, or None if no range is given
+    """
+    if start is None and end is None:
+        return None
+    keep = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        keep &= dates >= parse_bound(start)
+    if end is not None:
+        keep &= dates <= parse_bound(end, end=True)
+    return keep
+
+
+def select_frame(data, start=None, end=None, sites=None):
+    """Keep the readings of a 2D catchment data frame within the given sites and date range.
+
+    :param data: A 2D Pandas data frame with measurement data
+    :param start: Earliest measurement time to keep, inclusive
+    :param end: Latest measurement time to keep, inclusive; a date alone keeps the whole day
+    :param sites: Site IDs to keep, all sites if omitted
+    :returns: A 2D Pandas data frame, with the kept sites in their original order
+    """
+    keep = date_mask(data.index, start, end)
+    if keep is not None:
+        data = data[keep]
+    if sites is not None:
+        wanted = set(sites)
+        data = data[[site for site in data.columns if site in wanted]]
+    return data
+
+
+def select_rows(dataset, date_format=None, start=None, end=None, sites=None):
+    """Drop the rows of a long-format dataset outside the given sites and date range.
+
+    Rows are filtered by site before any dates are parsed, and by date before
+    they are reshaped.
+
+    :param dataset: Pandas dataframe with Date and Site columns
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :returns: Tuple of (parsed dates, filtered dataset)
+    """
+    if sites is not None:
+        dataset = dataset[dataset['Site'].isin(list(sites))]
+
+    dates = parse_dates(dataset['Date'], date_format)
+
+    keep = date_mask(dates, start, end)
+    if keep is not None:
+        dates = dates[keep]
+        dataset = dataset[keep]
+
+    return dates, dataset
+
+
+def records_to_wide(records, measurements, date_format=None, buffer_size=DEFAULT_CHUNKSIZE,
+                    start=None, end=None, sites=None):
+    """Reshape a stream of (date, site, value, ...) records into 2D catchment
+    data frames, one per measurement.
+
+    Records are collected buffer_size at a time and converted to compact
+    datetime64, integer site code and float arrays, so the stream never has to
+    be held in memory as Python objects.
+
+    :param records: Iterable of tuples of date string, site ID and one value
+                    per measurement
+    :param measurements: Names of the measurements, in the order their values
+                         appear in each record
+    :param date_format: strftime format of the dates, inferred if omitted
+    :param buffer_size: Number of records to collect before converting them to arrays
+    :param start: Earliest measurement time to keep, inclusive
+    :param end: Latest measurement time to keep, inclusive
+    :param sites: Site IDs to keep, all sites if omitted
+    :returns: Dictionary of measurement name -> 2D Pandas data frame
+    """
+    fields = ['Date', 'Site'] + list(measurements)
+    chunks = {field: [] for field in fields}
+    site_codes = {}
+    site_filter = None if sites is None else set(sites)
+
+    def flush(buffer):
+        instrument.count(len(buffer))
+        columns = list(zip(*buffer)) if buffer else [()] * len(fields)
+        dates = parse_dates(columns[0], date_format)
+        keep = date_mask(dates, start, end)
+        if keep is None:
+            keep = slice(None)
+        chunks['Date'].append(dates.values[keep])
+        chunks['Site'].append(np.array([site_codes.setdefault(site, len(site_codes)) for site in columns[1]],
+                                       dtype=np.int32)[keep])
+        for name, values in zip(measurements, columns[2:]):
+            try:
+                values = np.array(values, dtype=float)
+            except (TypeError, ValueError):
+                values = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+            chunks[name].append(values[keep])
+
+    buffer = []
+    for record in records:
+        # Records with no site cannot be placed in any column
+        if record[1] is None or record[1] == '':
+            continue
+        if site_filter is not None and record[1] not in site_filter:
+            continue
+        buffer.append(record)
+        if len(buffer) >= buffer_size:
+            flush(buffer)
+            buffer = []
+    if len(buffer) > 0 or len(chunks['Date']) == 0:
+        flush(buffer)
+
+    dates = np.concatenate(chunks['Date'])
+    sites = pd.Categorical.from_codes(np.concatenate(chunks['Site']),
+                                      categories=pd.Index(list(site_codes), dtype=object))
+    return long_to_wide_many(dates, sites, {name: np.concatenate(chunks[name]) for name in measurements})
+
+
+def iter_json_records(filename, fields):
+    """Stream records from a JSON export, keeping only the named fields.
+
+    Both a JSON array of objects (as in data/rain_data_2015-12.json) and
+    newline-delimited JSON, one object per line, are supported. Objects are
+    decoded one at a time, so the whole document is never held in memory.
 
-def read_variable_from_csv(filename, measurements='Rainfall (mm)'):
+    :param filename: Filename of JSON to load
+    :param fields: Names of the fields to keep
+    :returns: Iterator of tuples holding each record's field values (None if missing)
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, encoding='utf-8') as json_file:
+        text = json_file.read(JSON_READ_SIZE)
+        position = len(text) - len(text.lstrip())
+        is_array = text[position:position + 1] == '['
+        if is_array:
+            position += 1
+
+        while True:
+            # Skip separators between records
+            while True:
+                while position < len(text) and text[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(text):
+                    break
+                text = json_file.read(JSON_READ_SIZE)
+                position = 0
+                if text == '':
+                    return
+            if is_array and text[position] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(text, position)
+            except json.JSONDecodeError:
+                more = json_file.read(JSON_READ_SIZE)
+                if more == '':
+                    raise
+                text = text[position:] + more
+                position = 0
+                continue
+
+            yield tuple(record.get(field) for field in fields)
+            position = end
+
+
+def _read_json(filename, measurements, date_format, buffer_size, start, end, sites):
+    """Read measurements from a JSON file, streaming it only if it is too large to parse whole."""
+    fields = ['Date', 'Site'] + measurements
+    if os.path.getsize(filename) > JSON_STREAM_BYTES:
+        return records_to_wide(iter_json_records(filename, fields), measurements, date_format, buffer_size,
+                               start, end, sites)
+
+    with open(filename, encoding='utf-8') as json_file:
+        text = json_file.read()
+    if text.lstrip().startswith('['):
+        records = json.loads(text)
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    del text
+    instrument.count(len(records))
+
+    # Only the fields needed are copied out of the records, missing ones as None
+    dataset = pd.DataFrame({field: [record.get(field) for record in records] for field in fields})
+    del records
+    # Records with no site cannot be placed in any column
+    dataset = dataset[dataset['Site'].notna() & (dataset['Site'] != '')]
+    dates, dataset = select_rows(dataset, date_format, start, end, sites)
+    return long_to_wide_many(dates, dataset['Site'],
+                             {name: pd.to_numeric(dataset[name], errors='coerce') for name in measurements})
+
+
+@cached
+def read_variable_from_csv(filename, measurements='Rainfall (mm)', date_format=None, start=None, end=None,
+                           sites=None):
     """Reads a named variable from a CSV file, and returns a
     pandas dataframe containing that variable. The CSV file must contain
     a column of dates, a column of site ID's, and (one or more) columns
     of data - only one of which will be read.
 
     :param filename: Filename of CSV to load
+    :param measurements: Name of the data column to read
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
     :return: 2D array of given variable. Index will be dates,
              Columns will be the individual sites
     """
-    dataset = pd.read_csv(filename, usecols=['Date', 'Site', measurements])
-
-    dataset = dataset.rename({'Date': 'OldDate'}, axis='columns')
-    dataset['Date'] = [
-        pd.to_datetime(x, dayfirst=True, format='mixed') for x in dataset['OldDate']
-        ]
-    dataset = dataset.drop('OldDate', axis='columns')
+    with instrument.stage('read_csv', filename) as record:
+        dataset = pd.read_csv(filename, usecols=['Date', 'Site', measurements], dtype=COMPACT_DTYPES)
+        record.count(len(dataset))
 
-    newdataset = pd.DataFrame(index=dataset['Date'].unique())
+    dates, dataset = select_rows(dataset, date_format, start, end, sites)
 
-    for site in dataset['Site'].unique():
-        newdataset[site] = dataset[dataset['Site'] == site].set_index('Date')[measurements]
+    return long_to_wide(dates, dataset['Site'], dataset[measurements])
 
-    newdataset = newdataset.sort_index()
 
-    return newdataset
-
-
-def read_variable_from_json(filename):
+@cached
+def read_variable_from_json(filename, measurements='Rainfall (mm)', date_format=None, buffer_size=DEFAULT_CHUNKSIZE,
+                            start=None, end=None, sites=None):
     """Reads a named variable from a JSON file, and returns a
     pandas dataframe containing that variable. The JSON file must contain
     a column of dates, a column of site ID's, and (one or more) columns
     of data - only one of which will be read.
 
+    The file may be a JSON array of records or newline-delimited JSON. Files
+    larger than JSON_STREAM_BYTES are read one record at a time, keeping only
+    the fields needed; smaller ones are parsed whole, which is faster.
+
     :param filename: Filename of JSON to load
+    :param measurements: Name of the data field to read
+    :param date_format: strftime format of the Date field, inferred if omitted
+    :param buffer_size: Number of records to collect before converting them to arrays
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
     :return: 2D array of given variable. Index will be dates,
              Columns will be the individual sites
     """
-    dataset = pd.read_json(filename, convert_dates=False)
-    dataset = dataset[['Date', 'Site', 'Rainfall (mm)']]
+    with instrument.stage('read_json', filename):
+        return _read_json(filename, [measurements], date_format, buffer_size, start, end, sites)[measurements]
 
-    dataset = dataset.rename({'Date':'OldDate'}, axis='columns')
-    dataset['Date'] = [pd.to_datetime(x,dayfirst=True) for x in dataset['OldDate']]
-    dataset = dataset.drop('OldDate', axis='columns')
 
-    newdataset = pd.DataFrame(index=dataset['Date'].unique())
+@cached
+def read_variables_from_csv(filename, measurements=('Rainfall (mm)',), date_format=None, start=None, end=None,
+                            sites=None):
+    """Reads several named variables from a CSV file in a single parse, and
+    returns a pandas dataframe for each of them.
 
-    for site in dataset['Site'].unique():
-        newdataset[site] = dataset[dataset['Site'] == site].set_index('Date')["Rainfall (mm)"]
+    :param filename: Filename of CSV to load
+    :param measurements: Names of the data columns to read
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :return: Dictionary of variable name -> 2D array of that variable.
+             Index will be dates shared by every variable,
+             Columns will be the individual sites
+    """
+    measurements = list(measurements)
+    with instrument.stage('read_csv', filename) as record:
+        dataset = pd.read_csv(filename, usecols=['Date', 'Site'] + measurements, dtype=COMPACT_DTYPES)
+        record.count(len(dataset))
+
+    dates, dataset = select_rows(dataset, date_format, start, end, sites)
 
-    newdataset = newdataset.sort_index()
+    return long_to_wide_many(dates, dataset['Site'], {name: dataset[name] for name in measurements})
 
-    return newdataset
+
+@cached
+def read_variables_from_json(filename, measurements=('Rainfall (mm)',), date_format=None,
+                             buffer_size=DEFAULT_CHUNKSIZE, start=None, end=None, sites=None):
+    """Reads several named variables from a JSON file in a single parse, and
+    returns a pandas dataframe for each of them.
+
+    :param filename: Filename of JSON to load
+    :param measurements: Names of the data fields to read
+    :param date_format: strftime format of the Date field, inferred if omitted
+    :param buffer_size: Number of records to collect before converting them to arrays
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :return: Dictionary of variable name -> 2D array of that variable.
+             Index will be dates shared by every variable,
+             Columns will be the individual sites
+    """
+    with instrument.stage('read_json', filename):
+        return _read_json(filename, list(measurements), date_format, buffer_size, start, end, sites)
 
 
-def read_variable_from_xml(filename):
+@cached
+def read_variable_from_xml(filename, measurements='Rainfall_mm', date_format=None, buffer_size=DEFAULT_CHUNKSIZE,
+                           start=None, end=None, sites=None):
     """Reads a named variable from a XML file, and returns a
     pandas dataframe containing that variable. The XML file must contain
     a column of dates, a column of site ID's, and (one or more) columns
     of data - only one of which will be read.
 
+    The document is parsed as a stream of records, each of which is cleared
+    once its fields are read, so memory use does not grow with the size of
+    the document beyond that of the parsed values.
+
     :param filename: Filename of XML to load
+    :param measurements: Name of the data element to read
+    :param date_format: strftime format of the Date element, inferred if omitted
+    :param buffer_size: Number of records to collect before converting them to arrays
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :return: 2D array of given variable. Index will be dates,
+             Columns will be the individual sites
+    """
+    def iter_records():
+        depth = 0
+        root = None
+        for event, element in ElementTree.iterparse(filename, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1:
+                # A complete record: read its fields, then discard it
+                yield element.findtext('Date'), element.findtext('Site'), element.findtext(measurements)
+                root.clear()
+
+    with instrument.stage('read_xml', filename):
+        return records_to_wide(iter_records(), [measurements], date_format, buffer_size, start, end,
+                               sites)[measurements]
+
+
+def read_site_information(filename):
+    """Reads the table of measurement sites, e.g. LOCAR_Site_Information.csv.
+
+    The notes at the end of the file are dropped, leaving one row per site.
+
+    :param filename: Filename of CSV to load
+    :return: Pandas dataframe of site details, indexed by site code
+    """
+    sites = pd.read_csv(filename, skipinitialspace=True)
+    sites.columns = sites.columns.str.strip()
+    sites = sites.dropna(subset=['Easting', 'Northing'])
+
+    return sites.set_index('Site Code')
+
+
+def iter_variable_from_csv(filename, measurements='Rainfall (mm)', chunksize=DEFAULT_CHUNKSIZE,
+                           date_format=None, start=None, end=None, sites=None):
+    """Reads a named variable from a CSV file in chunks of rows, yielding a
+    pandas dataframe for each chunk. Only one chunk is held in memory at a time.
+
+    :param filename: Filename of CSV to load
+    :param measurements: Name of the data column to read
+    :param chunksize: Number of CSV rows to parse per chunk
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :return: Iterator of 2D arrays of given variable. Index will be dates,
+             Columns will be the sites present in that chunk
+    """
+    with pd.read_csv(filename, usecols=['Date', 'Site', measurements], chunksize=chunksize,
+                     dtype=COMPACT_DTYPES) as reader:
+        for chunk in reader:
+            dates, chunk = select_rows(chunk, date_format, start, end, sites)
+            if len(chunk) == 0:
+                continue
+            yield long_to_wide(dates, chunk['Site'], chunk[measurements])
+
+
+def read_variable_from_csv_chunked(filename, measurements='Rainfall (mm)', chunksize=DEFAULT_CHUNKSIZE,
+                                   date_format=None, start=None, end=None, sites=None):
+    """Reads a named variable from a CSV file chunk by chunk, and returns the
+    same pandas dataframe as read_variable_from_csv.
+
+    :param filename: Filename of CSV to load
+    :param measurements: Name of the data column to read
+    :param chunksize: Number of CSV rows to parse per chunk
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
     :return: 2D array of given variable. Index will be dates,
              Columns will be the individual sites
     """
-    dataset = pd.read_xml(filename)
+    pieces = list(iter_variable_from_csv(filename, measurements, chunksize, date_format, start, end, sites))
+    if len(pieces) == 0:
+        return pd.DataFrame(index=pd.DatetimeIndex([]))
+
+    # A timestamp can be split across chunks, one set of sites in each
+    combined = pd.concat(pieces)
+    del pieces
+
+    return combined.groupby(level=0, sort=True).first()
+
+
+def read_daily_summary_from_csv(filename, measurements='Rainfall (mm)', stats=DAILY_STATS,
+                                chunksize=DEFAULT_CHUNKSIZE, date_format=None, start=None, end=None, sites=None):
+    """Calculate daily statistics of a named variable in a CSV file without
+    holding the full 2D array in memory.
+
+    Each chunk is reduced to per-day partial counts, sums, maxima and minima,
+    which are folded into running totals before the next chunk is read.
+
+    :param filename: Filename of CSV to load
+    :param measurements: Name of the data column to read
+    :param stats: Names of the statistics to return, any of 'sum', 'mean',
+                  'max', 'min' and 'count'
+    :param chunksize: Number of CSV rows to parse per chunk
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :returns: Dictionary of statistic name -> 2D Pandas data frame with one row per day
+    """
+    folds = {'sum': 'sum', 'count': 'sum', 'max': 'max', 'min': 'min'}
+    totals = None
+
+    for chunk in iter_variable_from_csv(filename, measurements, chunksize, date_format, start, end, sites):
+        partial = daily_summary(chunk, list(folds))
+        if totals is None:
+            totals = partial
+        else:
+            totals = {
+                name: getattr(pd.concat([totals[name], partial[name]]).groupby(level=0, sort=True), fold)()
+                for name, fold in folds.items()
+            }
+
+    if totals is None:
+        return {stat: pd.DataFrame() for stat in stats}
+
+    return {stat: _finalise_daily_stat(totals, stat) for stat in stats}
+
+
+def _finalise_daily_stat(totals, stat):
+    """Turn folded partial aggregates into a single daily statistic."""
+    if stat == 'mean':
+        return totals['sum'] / totals['count']
+    if stat not in totals:
+        raise ValueError(f'Unsupported daily statistic: {stat}')
+    return totals[stat]
+
+
+def day_bins(index):
+    """Convert a datetime64 index to integer day numbers (days since 1970-01-01).
+
+    :param index: A pandas DatetimeIndex, or anything np.datetime64 compatible
+    :returns: A 1D NumPy int64 array with one day number per timestamp
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.values.astype('datetime64[D]').astype(np.int64)
+
+
+def binned_reduce(values, bins, stats, ddof=1):
+    """Calculate several statistics of the rows of a 2D array falling in each bin.
+
+    The rows are sorted by bin once (if not already in order), and then each
+    statistic is a single np.ufunc.reduceat over the contiguous bins. NaN values
+    are skipped, following the pandas conventions: an empty sum is 0, and the
+    mean, max, min and std of an empty bin are NaN.
+
+    :param values: A 2D NumPy array with one row per measurement time
+    :param bins: A 1D integer array giving the bin of each row
+    :param stats: Names of the statistics to calculate, any of 'sum', 'mean',
+                  'max', 'min', 'std' and 'count'
+    :param ddof: Delta degrees of freedom used by 'std'
+    :returns: Tuple of (sorted unique bins, dictionary of statistic name -> 2D array)
+    """
+    unknown = set(stats) - set(BINNED_STATS)
+    if unknown:
+        raise ValueError(f'Unsupported statistic(s): {sorted(unknown)}')
+
+    with instrument.stage('aggregate') as record:
+        record.count(len(bins))
+        return _binned_reduce(values, bins, stats, ddof)
+
+
+def _binned_reduce(values, bins, stats, ddof):
+    bins = np.asarray(bins)
+    if len(bins) > 1 and np.any(bins[1:] < bins[:-1]):
+        order = np.argsort(bins, kind='stable')
+        bins = bins[order]
+        values = values[order]
+
+    if len(bins) == 0:
+        return bins, {stat: np.empty((0,) + values.shape[1:]) for stat in stats}
+
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    results = {}
+
+    if values.dtype.kind in 'iub':
+        # Integer data cannot hold NaN, so keep its dtype where pandas would
+        count = np.repeat(np.diff(np.r_[starts, len(bins)]), values.shape[1]).reshape(len(starts), -1)
+        filled = values
+        if 'sum' in stats:
+            results['sum'] = np.add.reduceat(values, starts, axis=0)
+        if 'max' in stats:
+            results['max'] = np.maximum.reduceat(values, starts, axis=0)
+        if 'min' in stats:
+            results['min'] = np.minimum.reduceat(values, starts, axis=0)
+    else:
+        values = np.asarray(values, dtype=float)
+        present = ~np.isnan(values)
+        count = np.add.reduceat(present, starts, axis=0, dtype=np.int64)
+        filled = np.where(present, values, 0.0)
+        if 'sum' in stats:
+            results['sum'] = np.add.reduceat(filled, starts, axis=0)
+        if 'max' in stats:
+            results['max'] = np.fmax.reduceat(values, starts, axis=0)
+        if 'min' in stats:
+            results['min'] = np.fmin.reduceat(values, starts, axis=0)
+
+    if 'count' in stats:
+        results['count'] = count
+
+    if 'mean' in stats or 'std' in stats:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.add.reduceat(filled, starts, axis=0, dtype=float) / count
+            if 'mean' in stats:
+                results['mean'] = mean
+            if 'std' in stats:
+                deviation = filled - np.repeat(mean, np.diff(np.r_[starts, len(bins)]), axis=0)
+                if values.dtype.kind == 'f':
+                    deviation[~present] = 0.0
+                squares = np.add.reduceat(deviation ** 2, starts, axis=0)
+                dof = count - ddof
+                results['std'] = np.where(dof > 0, np.sqrt(squares / np.where(dof > 0, dof, 1)), np.nan)
+
+    return bins[starts], {stat: results[stat] for stat in stats}
+
+
+def _calendar_period(offset):
+    """Describe a pandas calendar offset as (months per bin, first month of a bin)."""
+    if isinstance(offset, (pd.offsets.MonthBegin, pd.offsets.MonthEnd)):
+        return offset.n, 0
+    if isinstance(offset, pd.offsets.QuarterBegin):
+        return 3 * offset.n, (offset.startingMonth - 1) % 3
+    if isinstance(offset, pd.offsets.QuarterEnd):
+        return 3 * offset.n, offset.startingMonth % 3
+    if isinstance(offset, pd.offsets.YearBegin):
+        return 12 * offset.n, offset.month - 1
+    if isinstance(offset, pd.offsets.YearEnd):
+        return 12 * offset.n, offset.month % 12
+    return None
+
+
+def period_bins(index, period):
+    """Work out which resampling period each timestamp falls in, as an integer bin number.
+
+    Bins are calculated with integer arithmetic on the datetime64 values.
+    Fixed periods are aligned to the Unix epoch, weeks run from the day after
+    their anchor (Monday for 'W', which ends on Sunday), and months, quarters
+    and years follow the calendar.
+
+    :param index: A pandas DatetimeIndex, or anything np.datetime64 compatible
+    :param period: A pandas frequency string or offset: any fixed period such as
+                   '15min', 'h', '6h' or 'D', or a calendar period: weeks ('W',
+                   'W-MON', ...), months ('MS', 'ME'), quarters ('QS', 'QE') or
+                   years ('YS', 'YE')
+    :returns: A 1D NumPy int64 array with one bin number per timestamp
+    """
+    offset = pd.tseries.frequencies.to_offset(period)
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    nanoseconds = index.values.astype('datetime64[ns]').astype(np.int64)
+
+    if isinstance(offset, pd.offsets.Tick):
+        return nanoseconds // offset.nanos
+    if isinstance(offset, pd.offsets.Week) and offset.weekday is not None:
+        # 1970-01-01 was a Thursday, weekday 3
+        first_weekday = (offset.weekday + 1) % 7
+        days = nanoseconds // NANOSECONDS_PER_DAY
+        return (days + 3 - first_weekday) // (7 * offset.n)
+    calendar = _calendar_period(offset)
+    if calendar is not None:
+        months_per_bin, first_month = calendar
+        months = index.values.astype('datetime64[M]').astype(np.int64)
+        return (months - first_month) // months_per_bin
+    raise ValueError(f'Unsupported resampling period: {period}')
+
+
+def bin_starts(bins, period):
+    """Return the start time of each of the given period bins, as worked out by period_bins.
+
+    :param bins: 1D integer array of bin numbers
+    :param period: The pandas frequency string or offset used to calculate the bins
+    :returns: A pandas DatetimeIndex
+    """
+    offset = pd.tseries.frequencies.to_offset(period)
+    bins = np.asarray(bins, dtype=np.int64)
+
+    if isinstance(offset, pd.offsets.Tick):
+        starts = (bins * offset.nanos).astype('datetime64[ns]')
+    elif isinstance(offset, pd.offsets.Week) and offset.weekday is not None:
+        first_weekday = (offset.weekday + 1) % 7
+        starts = (bins * 7 * offset.n - 3 + first_weekday).astype('datetime64[D]')
+    else:
+        months_per_bin, first_month = _calendar_period(offset)
+        starts = (bins * months_per_bin + first_month).astype('datetime64[M]')
+
+    return pd.DatetimeIndex(starts.astype('datetime64[ns]'))
+
+
+def resample_summary(data, period='D', stats=DAILY_STATS, ddof=1):
+    """Calculate several statistics of a 2D data array per resampling period, in one pass.
+
+    Only periods holding at least one measurement time appear in the result.
+
+    :param data: A 2D Pandas data frame with measurement data.
+    Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param period: Resampling period, any pandas frequency supported by period_bins, e.g. 'h', '6h', 'W' or 'MS'
+    :param stats: Names of the statistics to calculate, any of 'sum', 'mean',
+                  'max', 'min', 'std' and 'count'
+    :param ddof: Delta degrees of freedom used by 'std'
+    :returns: Dictionary of statistic name -> 2D Pandas data frame with one row
+              per period, indexed by the start time of the period
+    """
+    bins, results = binned_reduce(data.to_numpy(), period_bins(data.index, period), stats, ddof)
+    index = bin_starts(bins, period)
 
-    dataset = dataset.rename({'Date':'OldDate', 'Site_Name': 'Site Name', 'Rainfall_mm': 'Rainfall (mm)'}, axis='columns')
-    dataset['Date'] = [pd.to_datetime(x,dayfirst=True) for x in dataset['OldDate']]
-    dataset = dataset.drop('OldDate', axis='columns')
+    return {stat: pd.DataFrame(result, index=index, columns=data.columns) for stat, result in results.items()}
 
-    newdataset = pd.DataFrame(index=dataset['Date'].unique())
 
-    for site in dataset['Site'].unique():
-        newdataset[site] = dataset[dataset['Site'] == site].set_index('Date')["Rainfall (mm)"]
+def rolling_summary(data, window, stats=('sum',), min_periods=1):
+    """Calculate statistics over a sliding window ending at each measurement time,
+    e.g. the 24 hour accumulated rainfall.
+
+    Each window's total is the difference of two cumulative sums, so the cost
+    does not depend on the length of the window.
+
+    :param data: A 2D Pandas data frame with measurement data, with a sorted
+                 np.datetime64 compatible index. Columns are measurement sites.
+    :param window: Length of time covered by each window, e.g. '24h' (the
+                   window includes its end but not its start), or a whole number
+                   of rows
+    :param stats: Names of the statistics to calculate, any of 'sum', 'mean' and 'count'
+    :param min_periods: Fewest readings a window needs for its sum or mean not to be NaN
+    :returns: Dictionary of statistic name -> 2D Pandas data frame with the same index and columns as data
+    """
+    unknown = set(stats) - set(ROLLING_STATS)
+    if unknown:
+        raise ValueError(f'Unsupported rolling statistic(s): {sorted(unknown)}')
+
+    with instrument.stage('rolling') as record:
+        record.count(len(data))
+        return _rolling_summary(data, window, stats, min_periods)
+
+
+def _rolling_summary(data, window, stats, min_periods):
+    values = data.to_numpy(dtype=float)
+    rows = np.arange(len(values))
+    if isinstance(window, (int, np.integer)):
+        first = np.maximum(rows - window + 1, 0)
+    else:
+        if not data.index.is_monotonic_increasing:
+            raise ValueError('Rolling windows need data sorted by time')
+        times = pd.DatetimeIndex(data.index).values.astype('datetime64[ns]').astype(np.int64)
+        first = np.searchsorted(times, times - pd.Timedelta(window).value, side='right')
+    last = rows + 1
+
+    def window_totals(array):
+        dtype = np.int64 if array.dtype == bool else array.dtype
+        totals = np.zeros((len(array) + 1,) + array.shape[1:], dtype=dtype)
+        np.cumsum(array, axis=0, dtype=dtype, out=totals[1:])
+        return totals[last] - totals[first]
+
+    present = ~np.isnan(values)
+    count = window_totals(present)
+    results = {}
+    if 'sum' in stats or 'mean' in stats:
+        total = window_totals(np.where(present, values, 0.0))
+        # Differences of cumulative sums leave rounding errors where a window is
+        # all zeros, such as a dry day, so those windows are set to exactly zero
+        total[window_totals((values != 0) & present) == 0] = 0.0
+        total[count < max(min_periods, 1)] = np.nan
+        if 'sum' in stats:
+            results['sum'] = total
+        if 'mean' in stats:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                results['mean'] = total / count
+    if 'count' in stats:
+        results['count'] = count.astype(float)
+
+    return {stat: pd.DataFrame(results[stat], index=data.index, columns=data.columns) for stat in stats}
+
+
+def daily_summary(data, stats=DAILY_STATS, ddof=1):
+    """Calculate several daily statistics of a 2D data array in one pass.
+
+    The day of each row is worked out once as an integer day number, rather
+    than building a datetime.date object per row for each statistic.
 
-    newdataset = newdataset.sort_index()
+    :param data: A 2D Pandas data frame with measurement data.
+    Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param stats: Names of the statistics to calculate, any of 'sum', 'mean',
+                  'max', 'min', 'std' and 'count'
+    :param ddof: Delta degrees of freedom used by 'std'
+    :returns: Dictionary of statistic name -> 2D Pandas data frame with one row per day.
+    """
+    results = resample_summary(data, 'D', stats, ddof)
 
-    return newdataset
+    # Days are indexed by datetime.date, one object per day rather than per row
+    return {stat: result.set_axis(pd.Index(result.index.date)) for stat, result in results.items()}
 
 
 def daily_total(data):
@@ -100,7 +899,7 @@ def daily_total(data):
     Index must be np.datetime64 compatible format. Columns are measurement sites.
     :returns: A 2D Pandas data frame with total values of the measurements for each day.
     """
-    return data.groupby(data.index.date).sum()
+    return daily_summary(data, ['sum'])['sum']
 
 
 def daily_mean(data):
@@ -110,7 +909,7 @@ def daily_mean(data):
     Index must be np.datetime64 compatible format.
     :returns: A 2D Pandas data frame with mean values of the measurements for each day.
     """
-    return data.groupby(data.index.date).mean()
+    return daily_summary(data, ['mean'])['mean']
 
 
 def daily_max(data):
@@ -120,7 +919,7 @@ def daily_max(data):
     Index must be np.datetime64 compatible format.
     :returns: A 2D PAndas data frame with maximum values of the measurements for each day.
     """
-    return data.groupby(data.index.date).max()
+    return daily_summary(data, ['max'])['max']
 
 
 def daily_min(data):
@@ -130,14 +929,24 @@ def daily_min(data):
     Index must be np.datetime64 compatible format.
     :returns: A 2D Pandas data frame with minimum values of the measurements for each day.
     """
-    return data.groupby(data.index.date).min()
+    return daily_summary(data, ['min'])['min']
 
 
-def data_normalise(data):
+def data_normalise(data, mode='max', zero_range=0.0):
     """Normalise any given 2D data array
-    
-    :param data: A 2D Pandas data frame with measurement data.
+
+    Sites whose maximum (or range, or standard deviation) is zero are given
+    zero_range rather than being divided by zero. See catchment.normalise for
+    normalising arrays in place and memory-mapped stores.
+
+    :param data: A 2D Pandas data frame (or NumPy array) with measurement data.
+    :param mode: 'max' to divide each site by its maximum, 'minmax' to scale
+                 each site's range to 0..1, or 'zscore' to standardise each site
+    :param zero_range: Value given to the readings of sites with no spread
     :returns : A normalised 2D Pandas data frame with measurement data.
     """
-    normal_max = np.array(np.max(data, axis=0))
-    return data / normal_max[np.newaxis, :]
+    from catchment import normalise
+
+    if isinstance(data, np.ndarray):
+        return normalise.normalise_array(data, mode, zero_range=zero_range)
+    return normalise.normalise_frame(data, mode, zero_range=zero_range)
@@ -0,0 +1,169 @@
+"""Module containing chunked normalisation of catchment data.
+
+Each site's readings are scaled in two passes over the data. The first pass
+streams through it a block of readings at a time, gathering per-site totals
+(maximum, minimum, or count, mean and sum of squared deviations), and the
+second pass applies the scaling block by block. Only one block of temporaries
+is held at a time, so normalising a memory-mapped store of any size needs a
+fixed amount of memory, and arrays can be normalised in place.
+
+Modes of normalisation:
+
+- 'max': divide by the site's maximum
+- 'minmax': subtract the site's minimum and divide by its range
+- 'zscore': subtract the site's mean and divide by its standard deviation
+
+Missing readings (NaN) are ignored when gathering the totals, and stay NaN.
+A site whose scale is zero, such as a dry rain gauge whose maximum is 0, is
+given a fixed value (by default 0.0) rather than dividing by zero.
+"""
+
+import numpy as np
+import pandas as pd
+
+from catchment import instrument, models
+
+
+MODES = ('max', 'minmax', 'zscore')
+
+
+def _blocks(length, chunk_size):
+    """Yield slices covering range(length) in pieces of at most chunk_size."""
+    for start in range(0, length, max(chunk_size, 1)):
+        yield slice(start, min(start + chunk_size, length))
+
+
+def _readings(values, axis, block):
+    """Return a block of readings from values as a (readings, sites) view."""
+    return values[block] if axis == 0 else values[:, block].T
+
+
+def scaling(values, mode='max', axis=0, chunk_size=models.DEFAULT_CHUNKSIZE, ddof=0):
+    """Calculate each site's offset and scale in one pass over blocks of readings.
+
+    :param values: 2D NumPy array (or memory map) of readings
+    :param mode: One of 'max', 'minmax' or 'zscore'
+    :param axis: Axis along which each site's readings run: 0 when sites are
+                 columns, as in a data frame, or 1 when sites are rows, as in a store
+    :param chunk_size: Number of readings to hold in memory at once
+    :param ddof: Delta degrees of freedom of the standard deviation in 'zscore' mode
+    :returns: Pair of 1D arrays (offset, scale), one element per site
+    """
+    if mode not in MODES:
+        raise ValueError(f'Unsupported normalisation mode: {mode}')
+
+    num_sites = values.shape[1 - axis]
+    high = np.full(num_sites, np.nan)
+    low = np.full(num_sites, np.nan)
+    count = np.zeros(num_sites, dtype=np.int64)
+    mean = np.zeros(num_sites)
+    m2 = np.zeros(num_sites)
+
+    for block in _blocks(values.shape[axis], chunk_size):
+        readings = np.asarray(_readings(values, axis, block), dtype=float)
+        if mode == 'zscore':
+            # Merge the block's totals with the parallel form of Welford's algorithm
+            block_count = np.count_nonzero(~np.isnan(readings), axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                block_mean = np.nansum(readings, axis=0) / block_count
+            block_m2 = np.nansum((readings - block_mean) ** 2, axis=0)
+            total = count + block_count
+            with np.errstate(invalid='ignore', divide='ignore'):
+                delta = np.where(block_count > 0, block_mean - mean, 0.0)
+                mean = mean + np.where(total > 0, delta * block_count / total, 0.0)
+                m2 = m2 + block_m2 + np.where(total > 0, delta ** 2 * count * block_count / total, 0.0)
+            count = total
+        else:
+            # fmax and fmin skip NaN, unlike max and min
+            high = np.fmax(high, np.fmax.reduce(readings, axis=0, initial=np.nan))
+            if mode == 'minmax':
+                low = np.fmin(low, np.fmin.reduce(readings, axis=0, initial=np.nan))
+
+    if mode == 'max':
+        return np.zeros(num_sites), high
+    if mode == 'minmax':
+        return low, high - low
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(m2 / (count - ddof))
+    std[count - ddof <= 0] = np.nan
+    return np.where(count > 0, mean, np.nan), std
+
+
+def apply_scaling(values, offset, scale, out=None, axis=0, chunk_size=models.DEFAULT_CHUNKSIZE, zero_range=0.0):
+    """Scale each site's readings as (value - offset) / scale, a block of readings at a time.
+
+    :param values: 2D NumPy array (or memory map) of readings
+    :param offset: 1D array of the offset of each site
+    :param scale: 1D array of the scale of each site
+    :param out: Floating point array of the same shape to write the result to,
+                which may be values itself. A new array is made if omitted.
+    :param axis: Axis along which each site's readings run, as for scaling
+    :param chunk_size: Number of readings to hold in memory at once
+    :param zero_range: Value given to the readings of sites whose scale is zero
+    :returns: The scaled array, out if given
+    """
+    if out is None:
+        out = np.empty(values.shape)
+    elif not np.issubdtype(out.dtype, np.floating):
+        raise ValueError('Normalised data can only be written to a floating point array')
+
+    zero = scale == 0
+    # Dividing by infinity sends every reading of a zero scale site to zero, keeping NaN
+    safe_scale = np.where(zero, np.inf, scale)
+    for block in _blocks(values.shape[axis], chunk_size):
+        result = _readings(out, axis, block)
+        np.subtract(_readings(values, axis, block), offset, out=result)
+        np.divide(result, safe_scale, out=result)
+        if zero.any():
+            result[:, zero] += zero_range
+    return out
+
+
+def normalise_array(values, mode='max', out=None, axis=0, chunk_size=models.DEFAULT_CHUNKSIZE, zero_range=0.0):
+    """Normalise each site's readings in a 2D array, in place if out is values.
+
+    :param values: 2D NumPy array (or memory map) of readings
+    :param mode: One of 'max', 'minmax' or 'zscore'
+    :param out: Floating point array to write the result to, as for apply_scaling
+    :returns: The normalised array
+    """
+    with instrument.stage('normalise') as record:
+        record.count(values.shape[axis])
+        offset, scale = scaling(values, mode, axis, chunk_size)
+        return apply_scaling(values, offset, scale, out, axis, chunk_size, zero_range)
+
+
+def normalise_frame(data, mode='max', chunk_size=models.DEFAULT_CHUNKSIZE, zero_range=0.0):
+    """Normalise each site (column) of a 2D Pandas data frame.
+
+    The values are copied once into the result, which is then scaled in place.
+
+    :param data: A 2D Pandas data frame with measurement data
+    :param mode: One of 'max', 'minmax' or 'zscore'
+    :returns: A normalised 2D Pandas data frame, with the same index and columns
+    """
+    values = data.to_numpy(dtype=float, copy=True)
+    normalise_array(values, mode, values, 0, chunk_size, zero_range)
+    return pd.DataFrame(values, index=data.index, columns=data.columns)
+
+
+def normalise_store(data_store, measurement='Rainfall (mm)', mode='max', output=None,
+                    chunk_size=models.DEFAULT_CHUNKSIZE, zero_range=0.0):
+    """Normalise each site of a measurement in a memory-mapped store.
+
+    :param data_store: store.MemmapStore to normalise
+    :param measurement: Name of the measurement to normalise
+    :param mode: One of 'max', 'minmax' or 'zscore'
+    :param output: Name of a new measurement to write the result to. If
+                   omitted, the measurement is normalised in place.
+    :param chunk_size: Number of measurement times to hold in memory at once
+    """
+    if output is None:
+        values = data_store.values(measurement, mode='r+')
+        out = values
+    else:
+        values = data_store.values(measurement)
+        out = data_store.create_values(output, values.dtype if np.issubdtype(values.dtype, np.floating) else 'float64')
+
+    normalise_array(values, mode, out, 1, chunk_size, zero_range)
+    out.flush()
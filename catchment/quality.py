@@ -0,0 +1,210 @@
+"""Module containing quality control of logger data, applied as it is read.
+
+The loggers record every 15 minutes, but exports have gaps, timestamps
+repeated for a site, sensors stuck at one value and spikes, some caused by a
+failing battery. Quality control runs on the parsed (date, site, value)
+arrays while they are reshaped into a 2D array, flagging each reading with
+bits of a small integer mask:
+
+- MISSING: no reading at an expected time on the regular cadence
+- DUPLICATE: more than one reading for the time and site (the first is kept)
+- STUCK: part of a long run of the same value (zero, a dry rain gauge, is
+  not counted by default)
+- SPIKE: outside the valid range, or jumping away from both neighbours by
+  more than a limit
+- LOW_BATTERY: the logger's battery voltage was below a limit
+
+Every check is a vectorised operation over whole arrays (run lengths come from
+cumulative sums, for example), so multi-year archives are checked in time
+proportional to their size. Readings flagged STUCK, SPIKE or LOW_BATTERY are
+removed (set to NaN) from the cleaned data. Readings with timestamps far
+from the rest, which would stretch the grid, are dropped before it is sized.
+"""
+
+import numpy as np
+import pandas as pd
+
+from catchment import instrument, models
+
+
+MISSING = 1
+DUPLICATE = 2
+STUCK = 4
+SPIKE = 8
+LOW_BATTERY = 16
+
+FLAGS = {'missing': MISSING, 'duplicate': DUPLICATE, 'stuck': STUCK, 'spike': SPIKE, 'low_battery': LOW_BATTERY}
+
+# Flags whose readings are removed from the cleaned data
+REMOVED = STUCK | SPIKE | LOW_BATTERY
+
+DEFAULT_CADENCE = '15min'
+
+# Readings further than this from the median time are taken to have corrupt
+# timestamps, so one far-future date cannot stretch the grid over centuries
+DEFAULT_MAX_SPAN = pd.Timedelta(days=7305)
+
+# Checks suited to rain gauges: no negative rainfall, and no gauge reporting
+# the same non-zero amount for a whole day of readings
+RAIN_CHECKS = {'valid_range': (0.0, None), 'stuck_run': 96}
+
+
+def _to_grid(rows, columns, values, shape, keep):
+    """Scatter the kept records into a 2D array, with NaN where there is no record."""
+    grid = np.full(shape, np.nan)
+    grid[rows[keep], columns[keep]] = values[keep]
+    return grid
+
+
+def run_lengths(values):
+    """Return, for each element of a 2D array, the length of the run of equal values along axis 0 it is part of.
+
+    NaN is never equal to anything, so each NaN is a run of its own.
+    """
+    starts = np.ones(values.shape, dtype=bool)
+    starts[1:] = values[1:] != values[:-1]
+    # Number the runs down each column in turn, so runs never span two sites
+    run_ids = np.cumsum(starts.ravel(order='F')) - 1
+    lengths = np.bincount(run_ids)[run_ids]
+    return lengths.reshape(values.shape, order='F')
+
+
+def spikes(values, valid_range=(None, None), max_jump=None):
+    """Find readings outside the valid range, or jumping away from both neighbours by more than max_jump.
+
+    :param values: 2D NumPy array with one row per measurement time
+    :param valid_range: Pair of (lowest, highest) valid value, either of which may be None
+    :param max_jump: Largest change allowed between consecutive readings in
+                     opposite directions, or None not to check
+    :returns: Boolean 2D NumPy array
+    """
+    low, high = valid_range
+    found = np.zeros(values.shape, dtype=bool)
+    if low is not None:
+        found |= values < low
+    if high is not None:
+        found |= values > high
+    if max_jump is not None and len(values) > 2:
+        rise = values[1:-1] - values[:-2]
+        fall = values[1:-1] - values[2:]
+        found[1:-1] |= (np.abs(rise) > max_jump) & (np.abs(fall) > max_jump) & (np.sign(rise) == np.sign(fall))
+    return found
+
+
+def check_records(dates, sites, values, battery=None, cadence=DEFAULT_CADENCE, valid_range=(None, None),
+                  max_jump=None, stuck_run=None, stuck_ignore=(0.0,), min_battery=None, max_span=DEFAULT_MAX_SPAN):
+    """Check long (date, site, value) records and reshape them into a 2D catchment data frame, in one pass.
+
+    :param dates: Sequence of datetime64 compatible measurement times
+    :param sites: Sequence of site IDs, one per measurement, which may be categorical
+    :param values: Sequence of measurement values
+    :param battery: Sequence of logger battery voltages, one per measurement, if known
+    :param cadence: Expected interval between readings
+    :param valid_range: Pair of (lowest, highest) valid value, either of which may be None
+    :param max_jump: Largest change allowed between consecutive readings in opposite directions
+    :param stuck_run: Number of equal consecutive readings from which a sensor
+                      counts as stuck, or None not to check
+    :param stuck_ignore: Values that may legitimately repeat, such as 0 for rain
+    :param min_battery: Lowest battery voltage at which readings are trusted
+    :param max_span: Furthest a reading may be from the median time before it
+                     is dropped as out of window, or None not to check
+    :returns: Tuple of (cleaned 2D Pandas data frame on the regular cadence,
+              2D Pandas data frame of uint8 flags with the same index and columns,
+              Pandas data frame of the count of each flag per site, along with
+              the number of 'readings', of readings 'off_cadence', of readings
+              with 'no_date' and of readings 'out_of_window')
+    """
+    with instrument.stage('quality') as record:
+        dates = pd.DatetimeIndex(dates)
+        record.count(len(dates))
+        site_codes, unique_sites = pd.factorize(models._compact(sites))
+        columns = pd.Index(np.asarray(unique_sites, dtype=object), dtype=object)
+
+        # Records with no site have no column, and are dropped; those with no
+        # date have no row, and are dropped but counted against their site
+        dated = ~dates.isna()
+        no_date = np.bincount(site_codes[~dated & (site_codes >= 0)], minlength=len(columns))
+        placed = dated & (site_codes >= 0)
+        all_times = dates.values.astype('datetime64[ns]').astype(np.int64)
+
+        # The grid is sized before anything else, so readings far from the
+        # bulk of the data are dropped first, and counted against their site
+        out_of_window = np.zeros(len(columns), dtype=np.int64)
+        if max_span is not None and placed.any():
+            middle = np.median(all_times[placed])
+            outlying = placed & (np.abs(all_times - middle) > pd.Timedelta(max_span).value)
+            out_of_window = np.bincount(site_codes[outlying], minlength=len(columns))
+            placed &= ~outlying
+
+        site_codes = site_codes[placed]
+        values = np.asarray(values, dtype=float)[placed]
+        if battery is not None:
+            battery = np.asarray(battery, dtype=float)[placed]
+
+        step = pd.Timedelta(cadence).value
+        times = all_times[placed]
+        # The grid starts on a cadence boundary, so an early off-cadence reading cannot shift it
+        first = pd.Timestamp(times.min()).floor(cadence).value if len(times) else 0
+        rows = (times - first) // step
+        on_cadence = (times - first) % step == 0
+        periods = int(rows.max()) + 1 if len(rows) else 0
+        index = pd.DatetimeIndex((first + np.arange(periods) * step).astype('datetime64[ns]'))
+
+        # The first record of each (time, site) is kept, and the others counted as duplicates
+        cells = np.where(on_cadence, rows * len(columns) + site_codes, -1)
+        unique_cells, first_records, counts = np.unique(cells, return_index=True, return_counts=True)
+        keep = np.zeros(len(cells), dtype=bool)
+        keep[first_records[unique_cells >= 0]] = True
+
+        shape = (periods, len(columns))
+        data = _to_grid(rows, site_codes, values, shape, keep)
+        flags = np.zeros(shape, dtype=np.uint8)
+        duplicated = unique_cells[(unique_cells >= 0) & (counts > 1)]
+        flags.flat[duplicated] |= DUPLICATE
+
+        flags[np.isnan(data)] |= MISSING
+        flags[spikes(data, valid_range, max_jump)] |= SPIKE
+        if stuck_run is not None:
+            stuck = (run_lengths(data) >= stuck_run) & ~np.isin(data, stuck_ignore)
+            flags[stuck] |= STUCK
+        if battery is not None and min_battery is not None:
+            flags[_to_grid(rows, site_codes, battery, shape, keep) < min_battery] |= LOW_BATTERY
+
+        data[(flags & REMOVED) != 0] = np.nan
+
+        summary = pd.DataFrame({name: ((flags & bit) != 0).sum(axis=0) for name, bit in FLAGS.items()},
+                               index=columns)
+        summary['readings'] = np.bincount(site_codes[keep], minlength=len(columns))
+        summary['off_cadence'] = np.bincount(site_codes[~on_cadence], minlength=len(columns))
+        summary['no_date'] = no_date
+        summary['out_of_window'] = out_of_window
+
+    return (pd.DataFrame(data, index=index, columns=columns),
+            pd.DataFrame(flags, index=index, columns=columns),
+            summary)
+
+
+def read_checked_csv(filename, measurements='Rainfall (mm)', battery_column=None, date_format=None, start=None,
+                     end=None, sites=None, **checks):
+    """Read a named variable from a CSV file, checking its quality as it is reshaped.
+
+    :param filename: Filename of CSV to load
+    :param measurements: Name of the data column to read
+    :param battery_column: Name of the column of logger battery voltages, e.g.
+                           'Battery (V)' in the river exports, if any
+    :param date_format: strftime format of the Date column, inferred if omitted
+    :param start: Earliest measurement time to read, inclusive
+    :param end: Latest measurement time to read, inclusive
+    :param sites: Site IDs to read, all sites if omitted
+    :param checks: Limits of the checks, passed on to check_records, e.g. stuck_run=96
+    :returns: Tuple of (cleaned data, flags, summary) as given by check_records
+    """
+    usecols = ['Date', 'Site', measurements] + ([] if battery_column is None else [battery_column])
+    with instrument.stage('read_csv', filename) as record:
+        dataset = pd.read_csv(filename, usecols=usecols, dtype=models.COMPACT_DTYPES)
+        record.count(len(dataset))
+
+    dates, dataset = models.select_rows(dataset, date_format, start, end, sites)
+    battery = None if battery_column is None else dataset[battery_column]
+
+    return check_records(dates, dataset['Site'], dataset[measurements], battery, **checks)
@@ -0,0 +1,257 @@
+"""Module containing a resident analysis server, and a client for it.
+
+Dashboards ask many small questions of the same monthly data files, and
+starting a new process for each one means parsing the files again every time.
+The server instead stays running, reads each file of a data source (e.g.
+compute_data.CSVDataSource) once and keeps the 2D data frames in memory, least
+recently used first out once they outgrow a size limit. A file is only read
+again once its modification time or size changes.
+
+The server listens on localhost only, and answers HTTP GET requests with JSON:
+
+- /daily?file=rain_data_2015-12.csv&stats=sum,max: daily statistics of a file
+- /std: the standard deviation by day of every file, as compute_data.analyse_data
+- /normalised?file=rain_data_2015-12.csv&mode=max: a file's normalised readings
+- /status: the files held in memory
+
+Every request except /status can be narrowed with sites=FP35,PL16 and a
+from=... and to=... date range. Data frames are returned in the pandas 'split'
+layout, {"index": [...], "columns": [...], "data": [[...], ...]}.
+"""
+
+import collections
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+import pandas as pd
+
+from catchment import compute_data, models
+
+
+DEFAULT_PORT = 8765
+
+MAX_RESIDENT_BYTES = 1024 ** 3
+
+DATA_SOURCES = {
+    'csv': compute_data.CSVDataSource,
+    'json': compute_data.JSONDataSource,
+}
+
+
+def _frame_bytes(data):
+    return int(data.memory_usage(index=True).sum())
+
+
+class FrameCache:
+    """Data frames read from the files of a data source, held in memory up to a size limit."""
+
+    def __init__(self, data_source, max_bytes=MAX_RESIDENT_BYTES):
+        """
+        :param data_source: Data source whose read_file method reads a file, e.g. compute_data.CSVDataSource
+        :param max_bytes: Size above which the least recently used frames are dropped
+        """
+        self.data_source = data_source
+        self.max_bytes = max_bytes
+        # Path -> (modification time, size, data frame, bytes in memory)
+        self.frames = collections.OrderedDict()
+        self.reads = 0
+        # Guards the frames held; files are read without holding it, one
+        # reader at a time per file under that file's own lock
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    def files(self):
+        """Return a dictionary of file name -> path of every file in the data source."""
+        return {os.path.basename(path): path for path in self.data_source.find_files()}
+
+    def _held(self, path, version):
+        """Return the frame held for a file if it is of the given version, marking it recently used."""
+        with self._lock:
+            entry = self.frames.get(path)
+            if entry is None or entry[:2] != version:
+                return None
+            self.frames.move_to_end(path)
+            return entry[2]
+
+    def get(self, path):
+        """Return the data frame of a file, reading it only if it is not held or has changed since.
+
+        Reading a file holds up other requests for that file only, which then
+        use the frame read rather than reading it again.
+        """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        data = self._held(path, version)
+        if data is not None:
+            return data
+
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+        with path_lock:
+            data = self._held(path, version)
+            if data is not None:
+                return data
+            data = self.data_source.read_file(path)
+            with self._lock:
+                self.reads += 1
+                self.frames[path] = version + (data, _frame_bytes(data))
+                self.frames.move_to_end(path)
+                self._evict()
+        return data
+
+    def _evict(self):
+        total = sum(entry[3] for entry in self.frames.values())
+        # The most recently used frame is always kept, however large
+        while total > self.max_bytes and len(self.frames) > 1:
+            _, entry = self.frames.popitem(last=False)
+            total -= entry[3]
+
+    def status(self):
+        with self._lock:
+            return {'files': [os.path.basename(path) for path in self.frames],
+                    'bytes': sum(entry[3] for entry in self.frames.values()),
+                    'max_bytes': self.max_bytes,
+                    'reads': self.reads}
+
+
+def _split_list(params, name):
+    value = params.get(name)
+    return None if value is None else [item for item in value.split(',') if item]
+
+
+def _select(data, params):
+    """Narrow a data frame to the sites and date range asked for."""
+    return models.select_frame(data, params.get('from'), params.get('to'), _split_list(params, 'sites'))
+
+
+def _file_data(frames, params):
+    name = params.get('file')
+    if name is None:
+        raise ValueError('No file given')
+    files = frames.files()
+    if name not in files:
+        raise LookupError(f'No such file in the data source: {name}')
+    return _select(frames.get(files[name]), params)
+
+
+def _frame_json(data):
+    """Lay out a data frame as JSON compatible 'split' data, with ISO 8601 dates."""
+    data = data.set_axis(pd.DatetimeIndex(data.index))
+    return json.loads(data.to_json(orient='split', date_format='iso'))
+
+
+def daily(frames, params):
+    stats = _split_list(params, 'stats') or list(models.DAILY_STATS)
+    results = models.daily_summary(_file_data(frames, params), stats)
+    return {stat: _frame_json(result) for stat, result in results.items()}
+
+
+def std(frames, params):
+    datasets = [_select(frames.get(path), params) for path in frames.files().values()]
+    result = compute_data.compute_standard_deviation_by_day(datasets, int(params.get('ddof', 1)),
+                                                            params.get('nan_policy', 'propagate'))
+    return {'std': _frame_json(result)}
+
+
+def normalised(frames, params):
+    result = models.data_normalise(_file_data(frames, params), params.get('mode', 'max'))
+    return {'normalised': _frame_json(result)}
+
+
+def status(frames, params):
+    return frames.status()
+
+
+ENDPOINTS = {
+    '/daily': daily,
+    '/std': std,
+    '/normalised': normalised,
+    '/status': status,
+}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path not in ENDPOINTS:
+            self._respond(404, {'error': f'Unknown request: {url.path}'})
+            return
+        try:
+            self._respond(200, ENDPOINTS[url.path](self.server.frames, params))
+        except LookupError as exc:
+            self._respond(404, {'error': str(exc)})
+        except ValueError as exc:
+            self._respond(400, {'error': str(exc)})
+        except Exception as exc:
+            # Answer rather than drop the connection, which the client would take for the server being down
+            self._respond(500, {'error': f'{type(exc).__name__}: {exc}'})
+
+    def _respond(self, code, body):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    """HTTP server answering requests from the frames of one data source."""
+
+    daemon_threads = True
+
+    def __init__(self, data_source, port=DEFAULT_PORT, max_bytes=MAX_RESIDENT_BYTES, quiet=False):
+        """
+        :param data_source: Data source to answer requests from, e.g. compute_data.CSVDataSource
+        :param port: Port to listen on, on localhost. 0 picks a free one.
+        :param max_bytes: Size above which the least recently used frames are dropped
+        :param quiet: Don't log each request to stderr
+        """
+        super().__init__(('127.0.0.1', port), _RequestHandler)
+        self.frames = FrameCache(data_source, max_bytes)
+        self.quiet = quiet
+
+
+def serve(dir_path, file_format='csv', port=DEFAULT_PORT, max_bytes=MAX_RESIDENT_BYTES):
+    """Answer requests for the data files in a directory until interrupted.
+
+    :param dir_path: Directory of the data files
+    :param file_format: 'csv' or 'json', the format of the data files
+    """
+    if file_format not in DATA_SOURCES:
+        raise ValueError(f'Unsupported file format: {file_format}')
+    with AnalysisServer(DATA_SOURCES[file_format](dir_path), port, max_bytes) as server:
+        server.serve_forever()
+
+
+def query(request, port=DEFAULT_PORT, **params):
+    """Ask a running server a question.
+
+    :param request: Name of the request, e.g. 'daily', 'std', 'normalised' or 'status'
+    :param port: Port the server listens on
+    :param params: Parameters of the request, e.g. file='rain_data_2015-12.csv', sites='FP35'
+    :returns: The decoded JSON response
+    """
+    params = {name: value for name, value in params.items() if value is not None}
+    url = f'http://127.0.0.1:{port}/{request}?{urlencode(params)}'
+    try:
+        with urlopen(url) as response:
+            return json.load(response)
+    except HTTPError as exc:
+        raise ValueError(json.load(exc).get('error', str(exc))) from None
+
+
+def to_frame(split_data):
+    """Turn a data frame returned by the server back into a 2D Pandas data frame."""
+    return pd.DataFrame(split_data['data'], index=pd.DatetimeIndex(split_data['index']).tz_localize(None),
+                        columns=pd.Index(split_data['columns'], dtype=object), dtype=float)
@@ -0,0 +1,121 @@
+"""Module containing spatial grouping of measurement sites into river catchments.
+
+Each site in the site information table (e.g. LOCAR_Site_Information.csv) is
+assigned to the catchment polygon (data/river_catchments/*.shp) containing it,
+using a spatial join backed by an R-tree index of the polygons. The mapping
+only changes when those files do, so it is saved in the cache directory and
+reused until then.
+
+Per-site data, such as the output of models.daily_summary, can then be rolled
+up to one column per catchment.
+"""
+
+import glob
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from catchment import cache, models
+
+
+CATCHMENT_SUFFIX = '_catchment.shp'
+
+
+def load_catchments(catchment_dir):
+    """Read every catchment shapefile in a directory into one GeoDataFrame.
+
+    :param catchment_dir: Directory holding <name>_catchment.shp files
+    :returns: GeoDataFrame of catchment polygons in WGS84, with a 'catchment'
+              column holding the name taken from each file
+    """
+    import geopandas as gpd
+
+    shapefiles = sorted(glob.glob(os.path.join(catchment_dir, '*' + CATCHMENT_SUFFIX)))
+    if len(shapefiles) == 0:
+        raise ValueError('No catchment shapefiles found in directory')
+
+    frames = []
+    for shapefile in shapefiles:
+        polygons = gpd.read_file(shapefile).to_crs(epsg=4326)
+        polygons['catchment'] = os.path.basename(shapefile)[:-len(CATCHMENT_SUFFIX)]
+        frames.append(polygons[['catchment', 'geometry']])
+
+    return gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs='EPSG:4326')
+
+
+def assign_sites_to_catchments(site_info_path, catchment_dir):
+    """Work out which catchment each measurement site lies in.
+
+    :param site_info_path: Filename of the site information CSV
+    :param catchment_dir: Directory holding <name>_catchment.shp files
+    :returns: Pandas series of catchment name indexed by site code.
+              Sites outside every catchment are left out.
+    """
+    import geopandas as gpd
+
+    sites = models.read_site_information(site_info_path)
+    points = gpd.GeoDataFrame(index=sites.index,
+                              geometry=gpd.points_from_xy(sites['Longitude'], sites['Latitude']),
+                              crs='EPSG:4326')
+
+    joined = gpd.sjoin(points, load_catchments(catchment_dir), how='inner', predicate='within')
+    # A site on the boundary of two polygons of the same catchment appears twice
+    joined = joined[~joined.index.duplicated()]
+
+    return joined['catchment'].rename_axis('Site Code')
+
+
+def _inputs_key(site_info_path, catchment_dir):
+    """Fingerprint the site table and shapefiles by path, modification time and size."""
+    paths = [site_info_path] + sorted(glob.glob(os.path.join(catchment_dir, '*_catchment.*')))
+    description = repr([(os.path.abspath(path), os.stat(path).st_mtime_ns, os.stat(path).st_size)
+                        for path in paths])
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def site_catchments(site_info_path, catchment_dir):
+    """Return the catchment of each site, reusing the saved mapping if its inputs are unchanged.
+
+    :param site_info_path: Filename of the site information CSV
+    :param catchment_dir: Directory holding <name>_catchment.shp files
+    :returns: Pandas series of catchment name indexed by site code
+    """
+    mapping_path = os.path.join(cache.cache_dir(),
+                                f'site_catchments_{_inputs_key(site_info_path, catchment_dir)}.csv')
+    if cache.is_enabled() and os.path.exists(mapping_path):
+        # Mark the mapping as recently used, as cache.load does for datasets
+        os.utime(mapping_path)
+        return pd.read_csv(mapping_path, index_col='Site Code')['catchment']
+
+    mapping = assign_sites_to_catchments(site_info_path, catchment_dir)
+    if cache.is_enabled():
+        os.makedirs(cache.cache_dir(), exist_ok=True)
+        mapping.to_csv(mapping_path)
+        # Mappings for inputs that have since changed are evicted with old datasets
+        cache.evict()
+    return mapping
+
+
+def catchment_aggregate(data, site_catchment, stats=('mean',)):
+    """Roll per-site data up to per-catchment statistics.
+
+    The sites are grouped by catchment with one sort, and each statistic is
+    then a single vectorised reduction over the grouped columns.
+
+    :param data: A 2D Pandas data frame with one column per site, e.g. from models.daily_summary
+    :param site_catchment: Pandas series of catchment name indexed by site code
+    :param stats: Names of the statistics to calculate across the sites of each
+                  catchment, any of 'sum', 'mean', 'max', 'min', 'std' and 'count'
+    :returns: Dictionary of statistic name -> 2D Pandas data frame with the
+              same index as data and one column per catchment
+    """
+    catchments = site_catchment.reindex(data.columns)
+    known = catchments.notna().to_numpy()
+    codes, names = pd.factorize(catchments[known])
+
+    groups, results = models.binned_reduce(data.to_numpy()[:, known].T, codes, stats)
+    columns = pd.Index(np.asarray(names)[groups], dtype=object)
+
+    return {stat: pd.DataFrame(result.T, index=data.index, columns=columns) for stat, result in results.items()}
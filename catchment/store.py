@@ -0,0 +1,202 @@
+"""Module containing a memory-mapped binary store of catchment data.
+
+A store is a directory holding:
+
+- timestamps.npy: int64 nanoseconds since the epoch, one per measurement time
+- one .npy file per measurement, shaped (sites, times) so that each site's
+  series is contiguous on disk
+- metadata.json: the site index, the measurements held, and the range of
+  times (segment) that came from each original data file
+
+Arrays are opened with numpy memory mapping, so reading a time window or a
+subset of sites only reads those bytes from disk.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from catchment import models
+
+
+METADATA_FILE = 'metadata.json'
+TIMESTAMPS_FILE = 'timestamps.npy'
+
+
+def _site_order(datasets, site_info):
+    """Order sites as in the site information table, then any others as first seen."""
+    seen = list(pd.unique(np.concatenate([np.asarray(data.columns, dtype=object) for data in datasets])))
+    known = [] if site_info is None else [site for site in site_info.index if site in set(seen)]
+    known_set = set(known)
+    return known + [site for site in seen if site not in known_set]
+
+
+def write_store(path, datasets, measurement='Rainfall (mm)', names=None, site_info=None, dtype='float64'):
+    """Write 2D catchment data frames to a memory-mapped store.
+
+    If the store already exists the measurement is added to it, in which case
+    the datasets must cover exactly the same measurement times, and only the
+    sites, already in the store.
+
+    :param path: Directory of the store, created if needed
+    :param datasets: Sequence of 2D Pandas data frames, one per data file
+    :param measurement: Name of the measurement held in the datasets
+    :param names: Names of the data files the datasets came from
+    :param site_info: Site information dataframe indexed by site code, as given
+                      by models.read_site_information, used to order the sites
+    :param dtype: NumPy floating point type to store values as
+    """
+    datasets = list(datasets)
+    if len(datasets) == 0:
+        raise ValueError('No datasets to write to the store')
+    if names is None:
+        names = [str(i) for i in range(len(datasets))]
+
+    timestamps = np.concatenate([data.index.values.astype('datetime64[ns]').astype(np.int64)
+                                 for data in datasets])
+    bounds = np.cumsum([0] + [len(data) for data in datasets])
+    segments = [{'name': name, 'start': int(start), 'stop': int(stop), 'sites': list(data.columns)}
+                for name, start, stop, data in zip(names, bounds[:-1], bounds[1:], datasets)]
+
+    metadata_path = os.path.join(path, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        store = MemmapStore(path)
+        if not np.array_equal(store.timestamps, timestamps):
+            raise ValueError(f'Measurement times of {measurement} do not match those already in {path}')
+        new_sites = set(_site_order(datasets, site_info)) - set(store.sites)
+        if new_sites:
+            raise ValueError(f'Sites {sorted(new_sites)} are not already in {path}')
+        metadata = store.metadata
+    else:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, TIMESTAMPS_FILE), timestamps)
+        metadata = {'sites': _site_order(datasets, site_info), 'segments': segments, 'measurements': {}}
+
+    site_positions = {site: i for i, site in enumerate(metadata['sites'])}
+    filename = metadata['measurements'].get(measurement, {}).get(
+        'file', f"measurement_{len(metadata['measurements'])}.npy")
+
+    values = np.lib.format.open_memmap(os.path.join(path, filename), mode='w+',
+                                       dtype=dtype, shape=(len(site_positions), len(timestamps)))
+    values[:] = np.nan
+    for data, start, stop in zip(datasets, bounds[:-1], bounds[1:]):
+        rows = [site_positions[site] for site in data.columns]
+        values[rows, start:stop] = data.to_numpy(dtype=dtype).T
+    values.flush()
+    del values
+
+    metadata['measurements'][measurement] = {'file': filename, 'dtype': np.dtype(dtype).name}
+    with open(metadata_path, 'w') as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+
+
+def convert_data_source(data_source, path, measurement='Rainfall (mm)', site_info_path=None, dtype='float64'):
+    """Load all data from a data source, e.g. compute_data.CSVDataSource, into a store.
+
+    :param data_source: Object with a load_catchment_data method
+    :param path: Directory of the store
+    :param measurement: Name of the measurement the data source loads
+    :param site_info_path: Filename of the site information CSV, used to order sites
+    :param dtype: NumPy floating point type to store values as
+    """
+    names = None
+    if hasattr(data_source, 'find_files'):
+        names = [os.path.basename(file_path) for file_path in data_source.find_files()]
+    site_info = None if site_info_path is None else models.read_site_information(site_info_path)
+
+    write_store(path, data_source.load_catchment_data(), measurement, names, site_info, dtype)
+
+
+class MemmapStore:
+    """A memory-mapped store of catchment data written by write_store."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self.timestamps = np.load(os.path.join(path, TIMESTAMPS_FILE), mmap_mode='r')
+
+    @property
+    def sites(self):
+        return self.metadata['sites']
+
+    @property
+    def measurements(self):
+        return list(self.metadata['measurements'])
+
+    @property
+    def segments(self):
+        return self.metadata['segments']
+
+    def values(self, measurement, mode='r'):
+        """Return the memory-mapped (sites, times) array of a measurement.
+
+        :param mode: Memory map mode, 'r' to read or 'r+' to also write
+        """
+        try:
+            filename = self.metadata['measurements'][measurement]['file']
+        except KeyError:
+            raise ValueError(f'Measurement not in store: {measurement}') from None
+        return np.load(os.path.join(self.path, filename), mmap_mode=mode)
+
+    def create_values(self, measurement, dtype='float64'):
+        """Add a measurement to the store, returning its writable (sites, times) array filled with NaN."""
+        filename = self.metadata['measurements'].get(measurement, {}).get(
+            'file', f"measurement_{len(self.metadata['measurements'])}.npy")
+        values = np.lib.format.open_memmap(os.path.join(self.path, filename), mode='w+',
+                                           dtype=dtype, shape=(len(self.sites), len(self.timestamps)))
+        values[:] = np.nan
+
+        self.metadata['measurements'][measurement] = {'file': filename, 'dtype': np.dtype(dtype).name}
+        with open(os.path.join(self.path, METADATA_FILE), 'w') as metadata_file:
+            json.dump(self.metadata, metadata_file, indent=2)
+        return values
+
+    def read(self, measurement, sites=None, start=None, end=None, segment=None):
+        """Read part of a measurement as a 2D catchment data frame.
+
+        :param measurement: Name of the measurement to read
+        :param sites: Site IDs to read, all sites if omitted
+        :param start: Earliest measurement time to read, inclusive
+        :param end: Latest measurement time to read, inclusive
+        :param segment: Position of a single data file's segment to read.
+                        When given, sites default to those in that file.
+        :returns: 2D Pandas data frame. Index will be dates,
+                  Columns will be the individual sites
+        """
+        if segment is None:
+            segments = self.segments
+        else:
+            segments = [self.segments[segment]]
+            if sites is None:
+                sites = segments[0]['sites']
+        if sites is None:
+            sites = self.sites
+
+        site_positions = {site: i for i, site in enumerate(self.sites)}
+        rows = [site_positions[site] for site in sites]
+        values = self.values(measurement)
+
+        start = models.parse_bound(start)
+        end = models.parse_bound(end, end=True)
+        pieces = []
+        for piece in segments:
+            times = self.timestamps[piece['start']:piece['stop']]
+            first = piece['start']
+            last = piece['stop']
+            if start is not None:
+                first += int(np.searchsorted(times, start.value, side='left'))
+            if end is not None:
+                last = piece['start'] + int(np.searchsorted(times, end.value, side='right'))
+            if last <= first:
+                continue
+            pieces.append(pd.DataFrame(np.asarray(values[rows, first:last], dtype=float).T,
+                                       index=pd.DatetimeIndex(self.timestamps[first:last].astype('datetime64[ns]')),
+                                       columns=pd.Index(list(sites), dtype=object)))
+
+        if len(pieces) == 0:
+            return pd.DataFrame(index=pd.DatetimeIndex([]), columns=pd.Index(list(sites), dtype=object),
+                                dtype=float)
+        return pd.concat(pieces)
@@ -1,7 +1,17 @@
-"""Module containing code for plotting inflammation data."""
+"""Module containing code for plotting inflammation data.
 
-from matplotlib import pyplot as plt
-import numpy as np
+Matplotlib is only imported by the functions that draw figures, so the data
+writing functions can be used by batch jobs without loading it.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+
+OUTPUT_FORMATS = ('csv', 'json', 'parquet')
 
 
 def visualize(data_dict):
@@ -9,10 +19,19 @@ def visualize(data_dict):
 
     :param data_dict: Dictionary of name -> data to plot
     """
+    from matplotlib import pyplot as plt
 
     num_plots = len(data_dict)
     fig = plt.figure(figsize=((3 * num_plots) + 1, 3.0))
 
+    _draw(fig, data_dict)
+
+    plt.show()
+
+
+def _draw(fig, data_dict):
+    """Draw one subplot per named dataset on a figure."""
+    num_plots = len(data_dict)
     for i, (name, data) in enumerate(data_dict.items()):
         axes = fig.add_subplot(1, num_plots, i + 1)
 
@@ -22,4 +41,73 @@ def visualize(data_dict):
 
     fig.tight_layout()
 
-    plt.show()
+
+def save_figure(data_dict, filename):
+    """Plot the given data to an image file, without needing a display.
+
+    The figure is drawn with Matplotlib's object-oriented API and the Agg
+    canvas, so it is safe to call from worker processes.
+
+    :param data_dict: Dictionary of name -> data to plot
+    :param filename: Image file to write, e.g. a .png
+    """
+    from matplotlib.figure import Figure
+
+    num_plots = len(data_dict)
+    fig = Figure(figsize=((3 * num_plots) + 1, 3.0))
+
+    _draw(fig, data_dict)
+
+    fig.savefig(filename)
+
+
+def _save_figure_job(job):
+    save_figure(*job)
+
+
+def save_figures(jobs, workers=1):
+    """Plot several figures to image files, using a pool of worker processes.
+
+    :param jobs: List of (data_dict, filename) pairs, as passed to save_figure
+    :param workers: Number of worker processes, or 1 to plot in this process
+    """
+    if workers <= 1:
+        for job in jobs:
+            _save_figure_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # list() re-raises any error from a worker
+        list(executor.map(_save_figure_job, jobs))
+
+
+def output_name(*parts):
+    """Join parts of a name into a safe file name, e.g. ('rain', 'Rainfall (mm)') -> 'rain_Rainfall_mm'."""
+    return '_'.join(re.sub(r'\W+', '_', str(part)).strip('_') for part in parts)
+
+
+def save_data(data_dict, dir_path, prefix, output_format='csv'):
+    """Write each of the given data frames to its own file.
+
+    :param data_dict: Dictionary of name -> 2D Pandas data frame to write
+    :param dir_path: Directory to write the files to, created if needed
+    :param prefix: Start of each file name, followed by the data name
+    :param output_format: One of 'csv', 'json' or 'parquet' (needs pyarrow)
+    :returns: List of the filenames written
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unsupported output format: {output_format}')
+    os.makedirs(dir_path, exist_ok=True)
+
+    filenames = []
+    for name, data in data_dict.items():
+        filename = os.path.join(dir_path, f'{output_name(prefix, name)}.{output_format}')
+        data = data.set_axis(pd.DatetimeIndex(data.index).rename('Date'))
+        if output_format == 'csv':
+            data.to_csv(filename)
+        elif output_format == 'json':
+            data.to_json(filename, orient='split', date_format='iso')
+        else:
+            data.to_parquet(filename)
+        filenames.append(filename)
+
+    return filenames
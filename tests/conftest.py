@@ -0,0 +1,9 @@
+"""Shared test fixtures."""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep parsed data cached by tests out of the user's cache directory."""
+    monkeypatch.setenv('CATCHMENT_CACHE_DIR', str(tmp_path / 'cache'))
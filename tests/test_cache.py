@@ -0,0 +1,131 @@
+"""Tests for the on-disk cache of parsed data."""
+
+import os
+import shutil
+import pandas.testing as pdt
+from pathlib import Path
+
+
+def test_cached_read_matches_parsed_read(tmp_path):
+    """Test a warm read comes from the cache and gives the same dataframe."""
+    from catchment import cache
+    from catchment.models import read_variable_from_json
+
+    filename = Path.cwd() / "data" / "rain_data_small.json"
+    first = read_variable_from_json(filename)
+    assert len(os.listdir(cache.cache_dir())) == 1
+
+    cache.set_enabled(False)
+    try:
+        parsed = read_variable_from_json(filename)
+    finally:
+        cache.set_enabled(True)
+
+    pdt.assert_frame_equal(read_variable_from_json(filename), parsed)
+    pdt.assert_frame_equal(first, parsed)
+
+
+def test_filtered_reads_share_one_cached_parse():
+    """Test reads with different filters parse the file once, and match reads filtered while parsing."""
+    from catchment import cache
+    from catchment.models import read_variable_from_csv
+
+    filename = Path.cwd() / "data" / "rain_data_2015-12.csv"
+    filters = [{'start': '2005-12-05', 'end': '2005-12-06', 'sites': ['PL16']},
+               {'start': '02/12/2005 06:00', 'end': '03/12/2005'},
+               {'sites': ['FP35']}]
+    cached = [read_variable_from_csv(filename, **kwargs) for kwargs in filters]
+    assert len(os.listdir(cache.cache_dir())) == 1
+
+    cache.set_enabled(False)
+    try:
+        for kwargs, data in zip(filters, cached):
+            pdt.assert_frame_equal(data, read_variable_from_csv(filename, **kwargs))
+    finally:
+        cache.set_enabled(True)
+
+
+def test_buffer_size_is_not_part_of_the_cache_key():
+    """Test reads with different buffer sizes, which give the same data, share one cache entry."""
+    from catchment import cache
+    from catchment.models import read_variable_from_json
+
+    filename = Path.cwd() / "data" / "rain_data_small.json"
+    first = read_variable_from_json(filename, buffer_size=10)
+    pdt.assert_frame_equal(read_variable_from_json(filename, buffer_size=1000), first)
+    assert len(os.listdir(cache.cache_dir())) == 1
+
+
+def test_cache_key_changes_with_file_and_arguments(tmp_path):
+    """Test modifying the source file or changing the measurement gives a new key."""
+    from catchment.cache import cache_key
+
+    filename = tmp_path / "rain_data_small.csv"
+    shutil.copy(Path.cwd() / "data" / "rain_data_small.csv", filename)
+
+    key = cache_key('read_variable_from_csv', filename, {'measurements': 'Rainfall (mm)'})
+    assert key == cache_key('read_variable_from_csv', filename, {'measurements': 'Rainfall (mm)'})
+    assert key != cache_key('read_variable_from_csv', filename, {'measurements': 'pH continuous'})
+
+    with open(filename, 'a') as data_file:
+        data_file.write('FP35,Lower Wraxall Farm,02/12/2005 01:00,0\n')
+    assert key != cache_key('read_variable_from_csv', filename, {'measurements': 'Rainfall (mm)'})
+
+
+def test_evict_keeps_cache_within_size_limit():
+    """Test the least recently used entries are removed once over the size limit."""
+    from catchment import cache
+    from catchment.models import read_variable_from_csv
+
+    read_variable_from_csv(Path.cwd() / "data" / "rain_data_small.csv")
+    read_variable_from_csv(Path.cwd() / "data" / "rain_data_2015-12.csv")
+    assert len(os.listdir(cache.cache_dir())) == 2
+
+    cache.evict(max_bytes=0)
+    assert os.listdir(cache.cache_dir()) == []
+
+
+def test_cached_multiple_measurements():
+    """Test a dictionary of dataframes from a multi-measurement reader round trips through the cache."""
+    from catchment.models import read_variables_from_json
+
+    filename = Path.cwd() / "data" / "rain_data_small.json"
+    first = read_variables_from_json(filename, ['Rainfall (mm)'])
+    second = read_variables_from_json(filename, ['Rainfall (mm)'])
+
+    assert list(second) == ['Rainfall (mm)']
+    pdt.assert_frame_equal(second['Rainfall (mm)'], first['Rainfall (mm)'])
+
+
+def test_values_stored_compactly_when_exact():
+    """Test values exactly representable as float32 are stored as such, and loaded back as float64."""
+    import numpy as np
+    import pandas as pd
+    from catchment import cache
+
+    index = pd.date_range('2000-01-01', periods=3, freq='15min')
+    quarters = pd.DataFrame({'A': [0.25, np.nan, 2.0]}, index=index)
+    tenths = pd.DataFrame({'A': [0.1, np.nan, 2.0]}, index=index)
+    cache.store('quarters', quarters)
+    cache.store('tenths', tenths)
+
+    with np.load(os.path.join(cache.cache_dir(), 'quarters.npz')) as stored:
+        assert stored['values_0'].dtype == np.float32
+    with np.load(os.path.join(cache.cache_dir(), 'tenths.npz')) as stored:
+        assert stored['values_0'].dtype == np.float64
+    pdt.assert_frame_equal(cache.load('quarters'), quarters, check_freq=False)
+    pdt.assert_frame_equal(cache.load('tenths'), tenths, check_freq=False)
+
+
+def test_clear_only_deletes_cached_datasets():
+    """Test clearing the cache leaves writes in progress and other files in the cache directory alone."""
+    from catchment import cache
+    from catchment.models import read_variable_from_csv
+
+    read_variable_from_csv(Path.cwd() / "data" / "rain_data_small.csv")
+    directory = Path(cache.cache_dir())
+    (directory / "tmpab12cd.tmp").write_bytes(b'partial')
+    (directory / "notes.csv").write_text('mine\n')
+
+    cache.clear()
+    assert sorted(os.listdir(directory)) == ['notes.csv', 'tmpab12cd.tmp']
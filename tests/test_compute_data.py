@@ -1,5 +1,11 @@
+import datetime
+import multiprocessing
+import os
+import shutil
 import numpy as np
 import numpy.testing as npt
+import pandas.testing as pdt
+import pytest
 from pathlib import Path
 
 
@@ -39,4 +45,138 @@ def test_analyse_data():
                        [0.13449059, 0.        ],
                        [0.18285024, 0.19707288],
                        [0.19176008, 0.13915472]]
-    npt.assert_array_almost_equal(result, expected_output)
\ No newline at end of file
+    npt.assert_array_almost_equal(result, expected_output)
+
+
+def test_analyse_data_with_quality_checks():
+    """Test checking the quality of clean data leaves the analysis unchanged."""
+    from catchment.compute_data import analyse_data, CSVDataSource
+    from catchment.quality import RAIN_CHECKS
+    path = Path.cwd() / "data"
+    pdt.assert_frame_equal(analyse_data(CSVDataSource(path, checks=RAIN_CHECKS)),
+                           analyse_data(CSVDataSource(path)))
+
+@pytest.mark.parametrize("executor", ['thread', 'process'])
+def test_parallel_loading_keeps_file_order(tmp_path, executor):
+    """Test loading with a worker pool gives the same datasets, in the same order, as serial loading."""
+    from catchment.compute_data import CSVDataSource
+    from catchment.models import read_variable_from_csv
+
+    small = Path.cwd() / "data" / "rain_data_small.csv"
+    full = Path.cwd() / "data" / "rain_data_2015-12.csv"
+    shutil.copy(full, tmp_path / "rain_data_2015-11.csv")
+    shutil.copy(small, tmp_path / "rain_data_2015-12.csv")
+
+    data_source = CSVDataSource(tmp_path, workers=2, executor=executor)
+    loaded = list(data_source.load_catchment_data())
+
+    assert len(loaded) == 2
+    pdt.assert_frame_equal(loaded[0], read_variable_from_csv(full))
+    pdt.assert_frame_equal(loaded[1], read_variable_from_csv(small))
+
+    completed = dict(data_source.iter_completed())
+    assert sorted(completed) == sorted([str(tmp_path / "rain_data_2015-11.csv"),
+                                        str(tmp_path / "rain_data_2015-12.csv")])
+
+
+@pytest.mark.parametrize(
+    "nan_policy, expected_b",
+    [
+        ('propagate', [np.nan, 0.0]),
+        ('zero', [0.0, 0.0]),
+    ])
+def test_compute_standard_deviation_by_day_nan_policy(nan_policy, expected_b):
+    """Test days keep the order of the datasets, and the NaN policy applies to sites missing on a day."""
+    import pandas as pd
+    from catchment.compute_data import compute_standard_deviation_by_day
+
+    first = pd.DataFrame(data=[[1.0, 5.0], [3.0, np.nan]],
+                         index=pd.to_datetime(['2000-01-02 01:00', '2000-01-02 02:00']),
+                         columns=['A', 'B'])
+    second = pd.DataFrame(data=[[2.0, 4.0], [2.0, 4.0]],
+                          index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00']),
+                          columns=['B', 'A'])
+    result = compute_standard_deviation_by_day([first, second], nan_policy=nan_policy)
+
+    assert list(result.index) == [datetime.date(2000, 1, 2), datetime.date(2000, 1, 1)]
+    npt.assert_array_almost_equal(result['A'], [np.sqrt(2.0), 0.0])
+    npt.assert_array_almost_equal(result['B'], expected_b)
+
+    with pytest.raises(ValueError):
+        compute_standard_deviation_by_day([first, second], nan_policy='raise')
+
+
+def test_data_sources_filter_dates_and_sites(tmp_path):
+    """Test CSV and memory-mapped data sources only load the requested sites and dates."""
+    from catchment.compute_data import CSVDataSource, MemmapDataSource
+    from catchment.store import convert_data_source
+
+    path = Path.cwd() / "data"
+    convert_data_source(CSVDataSource(path), tmp_path / "store")
+
+    for data_source in [CSVDataSource(path, start='2005-12-05', end='2005-12-06', sites=['PL16']),
+                        MemmapDataSource(tmp_path / "store", start='2005-12-05', end='2005-12-06', sites=['PL16'])]:
+        data = list(data_source.load_catchment_data())[0]
+        assert list(data.columns) == ['PL16']
+        assert data.index[0] == np.datetime64('2005-12-05T00:00')
+        assert data.index[-1] == np.datetime64('2005-12-06T23:45')
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_summarise_files_reports_failures_in_order(tmp_path, workers):
+    """Test a file that fails to load is reported in its place without stopping the others."""
+    from catchment.compute_data import summarise_files
+    from catchment.models import daily_summary, read_variable_from_csv
+
+    small = Path.cwd() / "data" / "rain_data_small.csv"
+    missing = tmp_path / "missing.csv"
+    results = list(summarise_files([small, missing, small], workers=workers))
+
+    assert [filename for filename, *_ in results] == [small, missing, small]
+    assert results[1][1] is None
+    assert results[1][2].startswith('FileNotFoundError: ')
+
+    expected = daily_summary(read_variable_from_csv(small), ['sum', 'mean', 'max', 'min'])
+    for _, summary, error, seconds in (results[0], results[2]):
+        assert error is None
+        assert seconds >= 0
+        for stat, frame in expected.items():
+            pdt.assert_frame_equal(summary['Rainfall (mm)'][stat], frame)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='Worker processes only see the patched function when forked')
+def test_summarise_files_reports_unpicklable_errors(monkeypatch):
+    """Test an error that cannot be pickled in a worker process is still reported, with the other results."""
+    from catchment import compute_data
+
+    class LocalError(Exception):
+        """An exception defined in a function, which pickle cannot find by name."""
+
+    def failing_summary(filename, **kwargs):
+        raise LocalError(f'cannot summarise {filename}')
+
+    monkeypatch.setattr(compute_data, 'summarise_file', failing_summary)
+    results = list(compute_data.summarise_files(['a.csv', 'b.csv'], workers=2))
+
+    assert [error for _, _, error, _ in results] == ['LocalError: cannot summarise a.csv',
+                                                     'LocalError: cannot summarise b.csv']
+
+
+def test_summarise_files_passes_cache_setting_to_spawned_workers(tmp_path):
+    """Test turning the cache off also applies in worker processes that are spawned rather than forked."""
+    from catchment import cache
+    from catchment.compute_data import summarise_files
+
+    small = Path.cwd() / "data" / "rain_data_small.csv"
+    start_method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method('spawn', force=True)
+    cache.set_enabled(False)
+    try:
+        results = list(summarise_files([small, small], workers=2))
+    finally:
+        cache.set_enabled(True)
+        multiprocessing.set_start_method(start_method, force=True)
+
+    assert [error for _, _, error, _ in results] == [None, None]
+    assert not os.path.exists(cache.cache_dir()) or os.listdir(cache.cache_dir()) == []
@@ -0,0 +1,34 @@
+"""Tests for the command line arguments of the controller."""
+
+import importlib.util
+import pytest
+
+
+def create_argparse():
+    spec = importlib.util.spec_from_file_location('catchment_analysis', 'catchment-analysis.py')
+    controller = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(controller)
+    return controller.create_argparse()
+
+
+@pytest.mark.parametrize(
+    "arguments, expected_measurements",
+    [
+        (['-m', 'Rainfall (mm)', 'data/rain_data_2015-12.csv'], ['Rainfall (mm)']),
+        (['data/rain_data_2015-12.csv', '-m', 'Rainfall (mm)'], ['Rainfall (mm)']),
+        (['-m', 'pH continuous', '-m', 'Battery (V)', 'data/river_data_2015-12.csv'],
+         ['pH continuous', 'Battery (V)']),
+        (['data/rain_data_2015-12.csv'], None),
+    ])
+def test_measurement_options_leave_input_files(arguments, expected_measurements):
+    """Test measurement options given before the input files do not take them as measurements."""
+    args = create_argparse().parse_args(arguments)
+    assert args.measurements == expected_measurements
+    assert args.infiles == [argument for argument in arguments if argument.endswith('.csv')]
+
+
+def test_sites_are_comma_separated():
+    """Test --sites takes a comma-separated list, leaving the input files that follow it."""
+    args = create_argparse().parse_args(['--sites', 'FP35,PL16', 'data/rain_data_2015-12.csv'])
+    assert args.sites == ['FP35', 'PL16']
+    assert args.infiles == ['data/rain_data_2015-12.csv']
@@ -0,0 +1,72 @@
+"""Tests for lagged cross-correlation of rainfall and river data."""
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pytest
+
+
+def direct_correlation(x, y, lag):
+    """Correlate x[t] with y[t + lag] one lag at a time, over the readings both have."""
+    x = (x - np.nanmean(x)) / np.nanstd(x)
+    y = (y - np.nanmean(y)) / np.nanstd(y)
+    if lag >= 0:
+        x, y = x[:len(x) - lag], y[lag:]
+    else:
+        x, y = x[-lag:], y[:len(y) + lag]
+    both = ~np.isnan(x) & ~np.isnan(y)
+    return (x[both] * y[both]).sum() / both.sum()
+
+
+def test_lag_correlation_matches_direct_calculation():
+    """Test the FFT correlations of every pair and lag match a direct calculation, with missing readings."""
+    from catchment.correlation import lag_correlation
+    from catchment.models import read_variable_from_csv
+
+    rain = read_variable_from_csv('data/rain_data_2015-12.csv')
+    river = read_variable_from_csv('data/river_data_2015-12.csv', 'Water level continuous (mm)')
+    assert river['FP15'].isna().any()
+
+    lags, correlation = lag_correlation(rain, river, max_lag='6h', min_lag='-1h')
+
+    assert correlation.shape == (29, 2, 3)
+    steps = lags // pd.Timedelta('15min')
+    for i, rain_site in enumerate(rain.columns):
+        for j, river_site in enumerate(river.columns):
+            expected = [direct_correlation(rain[rain_site].to_numpy(), river[river_site].to_numpy(), lag)
+                        for lag in steps]
+            npt.assert_array_almost_equal(correlation[:, i, j], expected)
+
+
+def test_peak_lags_finds_known_delay():
+    """Test each river site's response is found at the delay it was made with, for its own gauge."""
+    from catchment.correlation import peak_lags
+
+    index = pd.date_range('2005-12-01', periods=2976, freq='15min')
+    rng = np.random.default_rng(42)
+    rain = pd.DataFrame(rng.gamma(0.1, 1.0, (2976, 2)), index=index, columns=['R1', 'R2'])
+    river = pd.DataFrame({'V1': rain['R1'].shift(12).fillna(0.0).to_numpy(),
+                          'V2': rain['R2'].shift(40).fillna(0.0).to_numpy()}, index=index)
+
+    result = peak_lags(rain, river, max_lag='1D')
+
+    assert result.loc[('R1', 'V1'), 'lag'] == pd.Timedelta('3h')
+    assert result.loc[('R2', 'V2'), 'lag'] == pd.Timedelta('10h')
+    assert result.loc[('R1', 'V1'), 'correlation'] == pytest.approx(1.0, abs=0.01)
+
+
+def test_peak_lags_pairs_sites_in_the_same_catchment():
+    """Test only gauges and river sites in the same catchment are paired."""
+    from catchment.correlation import peak_lags
+    from catchment.models import read_variable_from_csv
+
+    rain = read_variable_from_csv('data/rain_data_2015-12.csv')
+    river = read_variable_from_csv('data/river_data_2015-12.csv', 'Water level continuous (mm)')
+    site_catchment = pd.Series({'FP35': 'frome_piddle', 'FP15': 'frome_piddle', 'PL16': 'pang_lambourn',
+                                'PL17': 'pang_lambourn', 'TE20': 'tern'})
+
+    result = peak_lags(rain, river, site_catchment=site_catchment)
+
+    assert list(result.index) == [('FP35', 'FP15'), ('PL16', 'PL17')]
+    all_pairs = peak_lags(rain, river)
+    assert result.loc[('PL16', 'PL17'), 'lag'] == all_pairs.loc[('PL16', 'PL17'), 'lag']
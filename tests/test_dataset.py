@@ -0,0 +1,70 @@
+"""Tests for the lazily evaluated Dataset."""
+
+import pandas.testing as pdt
+from pathlib import Path
+
+
+def test_planned_query_matches_eager_functions():
+    """Test filtering, resampling and aggregating lazily gives the same result as the eager functions."""
+    from catchment.dataset import Dataset
+    from catchment.models import read_variable_from_csv, daily_summary, data_normalise
+
+    filename = Path.cwd() / "data" / "rain_data_2015-12.csv"
+    query = Dataset(filename).filter_dates('2005-12-03', '2005-12-09 23:45').filter_sites(['PL16'])
+
+    data = read_variable_from_csv(filename).loc['2005-12-03':'2005-12-09 23:45', ['PL16']]
+    expected = daily_summary(data, ['sum', 'max'])
+
+    result = query.resample('D').aggregate('sum', 'max').compute()
+    pdt.assert_frame_equal(result['sum'], expected['sum'])
+    pdt.assert_frame_equal(result['max'], expected['max'])
+    pdt.assert_frame_equal(query.resample('D').aggregate('sum').normalise().compute(),
+                           data_normalise(expected['sum']))
+
+
+def test_results_are_memoized_and_shared():
+    """Test repeated and narrower queries reuse data already loaded and statistics already computed."""
+    from catchment.dataset import Dataset
+
+    rain = Dataset(Path.cwd() / "data" / "rain_data_2015-12.xml")
+    first = rain.resample('D').aggregate('mean').compute()
+    memo_size = len(rain.memo)
+
+    assert rain.resample('D').aggregate('mean').compute() is first
+    assert len(rain.memo) == memo_size
+
+    week = rain.filter_dates('2005-12-01', '2005-12-07 23:45').resample('D').aggregate('mean').compute()
+    pdt.assert_frame_equal(week, first.iloc[:7])
+
+
+def test_cold_and_warm_loads_keep_the_same_dates():
+    """Test a date range read from the files, or sliced from memoized data, keeps the whole end day either way."""
+    from catchment import cache
+    from catchment.dataset import Dataset
+
+    filename = Path.cwd() / "data" / "rain_data_2015-12.csv"
+    cache.set_enabled(False)
+    try:
+        cold = Dataset(filename).filter_dates('2005-12-01', '07/12/2005').compute()
+        rain = Dataset(filename)
+        rain.compute()
+        warm = rain.filter_dates('2005-12-01', '07/12/2005').compute()
+    finally:
+        cache.set_enabled(True)
+
+    pdt.assert_frame_equal(cold, warm)
+    assert len(cold) == 7 * 96
+
+
+def test_hourly_and_rolling_queries():
+    """Test resampling to other periods and rolling windows give the same results as the eager functions."""
+    from catchment.dataset import Dataset
+    from catchment.models import read_variable_from_csv, resample_summary, rolling_summary
+
+    filename = Path.cwd() / "data" / "rain_data_2015-12.csv"
+    data = read_variable_from_csv(filename)
+
+    pdt.assert_frame_equal(Dataset(filename).resample('6h').aggregate('max').compute(),
+                           resample_summary(data, '6h', ['max'])['max'])
+    pdt.assert_frame_equal(Dataset(filename).rolling('24h').compute(),
+                           rolling_summary(data, '24h')['sum'])
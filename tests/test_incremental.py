@@ -0,0 +1,84 @@
+"""Tests for incremental calculation of daily statistics."""
+
+import pandas.testing as pdt
+import pytest
+from pathlib import Path
+
+
+@pytest.mark.parametrize("stat", ['sum', 'mean', 'max', 'min', 'std', 'count'])
+def test_updates_match_batch_statistics(tmp_path, stat):
+    """Test statistics from updates split part way through a day match those of the full data."""
+    from catchment.incremental import DailyAccumulator
+    from catchment.models import read_variable_from_csv, daily_summary
+
+    data = read_variable_from_csv(Path.cwd() / "data" / "river_data_2015-12.csv", 'pH continuous')
+
+    accumulator = DailyAccumulator()
+    accumulator.update(data.iloc[:1000])
+    accumulator.save(tmp_path / "totals.npz")
+    accumulator = DailyAccumulator.load(tmp_path / "totals.npz")
+    accumulator.update(data.iloc[1000:1500])
+    accumulator.update(data.iloc[1500:])
+
+    pdt.assert_frame_equal(accumulator.result(stat), daily_summary(data, [stat])[stat])
+
+
+def test_update_from_csv_reads_only_appended_rows(tmp_path):
+    """Test rows appended to a CSV file after an update are the only ones ingested next time."""
+    from catchment.incremental import DailyAccumulator
+    from catchment.models import read_variable_from_csv, daily_total
+
+    source = (Path.cwd() / "data" / "rain_data_2015-12.csv").read_text().splitlines(keepends=True)
+    filename = tmp_path / "rain_data_2015-12.csv"
+    filename.write_text(''.join(source[:3000]) + source[3000][:10])
+
+    accumulator = DailyAccumulator()
+    accumulator.update_from_csv(filename)
+    filename.write_text(''.join(source))
+    accumulator.update_from_csv(filename)
+    accumulator.update_from_csv(filename)
+
+    pdt.assert_frame_equal(accumulator.result('sum'), daily_total(read_variable_from_csv(filename)))
+
+
+def test_update_from_csv_rereads_truncated_file(tmp_path):
+    """Test a file rotated to something smaller than was already read is read again from its start."""
+    from catchment.incremental import DailyAccumulator
+    from catchment.models import read_variable_from_csv, daily_total
+
+    source = (Path.cwd() / "data" / "rain_data_2015-12.csv").read_text().splitlines(keepends=True)
+    filename = tmp_path / "rain_data_2015-12.csv"
+    filename.write_text(''.join(source[:3000]))
+
+    accumulator = DailyAccumulator()
+    accumulator.update_from_csv(filename)
+    filename.write_text(''.join(source[:1]) + ''.join(source[3000:4000]))
+    with pytest.warns(UserWarning, match='read again'):
+        accumulator.update_from_csv(filename)
+
+    # The readings before the rotation are kept, and those after it added
+    both = tmp_path / "both.csv"
+    both.write_text(''.join(source[:4000]))
+    pdt.assert_frame_equal(accumulator.result('sum'), daily_total(read_variable_from_csv(both)))
+
+
+def test_appending_days_grows_capacity_geometrically():
+    """Test adding a day at a time reallocates the totals a logarithmic number of times, with later backfills."""
+    from catchment.incremental import DailyAccumulator
+    from catchment.models import read_variable_from_csv, daily_summary
+
+    data = read_variable_from_csv(Path.cwd() / "data" / "river_data_2015-12.csv", 'pH continuous')
+    days = data.groupby(data.index.normalize())
+    pieces = [piece for _, piece in days]
+
+    accumulator = DailyAccumulator()
+    resizes = 0
+    for piece in pieces[1:] + pieces[:1]:
+        capacity = accumulator._totals['count'].shape
+        accumulator.update(piece)
+        resizes += accumulator._totals['count'].shape != capacity
+
+    assert resizes <= 7
+    assert accumulator._totals['count'].shape[1] == len(accumulator.sites)
+    for stat in ['sum', 'std', 'max']:
+        pdt.assert_frame_equal(accumulator.result(stat), daily_summary(data, [stat])[stat])
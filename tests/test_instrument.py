@@ -0,0 +1,78 @@
+"""Tests for instrumentation of the stages of the analysis pipeline."""
+
+import json
+import pytest
+from pathlib import Path
+
+
+@pytest.fixture
+def instrumented():
+    """Record stages for the duration of a test."""
+    from catchment import instrument
+
+    instrument.clear()
+    instrument.set_enabled(True)
+    yield instrument
+    instrument.set_enabled(False)
+    instrument.clear()
+
+
+def test_disabled_stages_are_not_recorded():
+    """Test stages cost nothing but a shared do-nothing object while instrumentation is off."""
+    from catchment import instrument
+    from catchment.models import read_variable_from_csv
+
+    read_variable_from_csv(Path.cwd() / "data" / "rain_data_small.csv")
+
+    assert instrument.stage('read_csv') is instrument.stage('parse_dates')
+    assert instrument.records() == []
+
+
+def test_nested_stages_record_rows_and_file(instrumented):
+    """Test reading a file records its parsing stages, each attributed to the file."""
+    from catchment.models import read_variable_from_csv
+
+    filename = Path.cwd() / "data" / "rain_data_small.csv"
+    with instrumented.stage('analysis', filename):
+        read_variable_from_csv(filename)
+
+    stages = {record['stage']: record for record in instrumented.records()}
+    assert {'cache_load', 'read_csv', 'parse_dates', 'reshape', 'analysis'} <= set(stages)
+    assert stages['read_csv']['rows'] == 16
+    assert stages['read_csv']['file'] == str(filename)
+    assert stages['analysis']['outermost'] and not stages['read_csv']['outermost']
+    assert stages['analysis']['wall'] >= stages['read_csv']['wall']
+
+    by_file = instrumented.summarise(instrumented.records(), 'file')
+    assert list(by_file) == [str(filename)]
+    assert by_file[str(filename)]['calls'] == 1
+    assert by_file[str(filename)]['rows'] == 16
+
+
+def test_worker_stages_are_collected(instrumented, tmp_path):
+    """Test stages recorded in worker processes are sent back, and can be written as a JSON trace."""
+    from catchment.compute_data import summarise_files
+
+    filenames = [Path.cwd() / "data" / "rain_data_small.csv", Path.cwd() / "data" / "rain_data_2015-12.csv"]
+    list(summarise_files(filenames, workers=2))
+
+    by_file = instrumented.summarise(instrumented.records(), 'file')
+    assert list(by_file) == [str(filename) for filename in filenames]
+    assert instrumented.summarise(instrumented.records())['aggregate']['calls'] == 2
+
+    instrumented.write_trace(tmp_path / 'trace.json', instrumented.records())
+    with open(tmp_path / 'trace.json') as trace_file:
+        trace = json.load(trace_file)
+    assert trace['by_stage']['read_csv']['rows'] == 16 + 5766
+    assert 'read_csv' in instrumented.format_summary(instrumented.records())
+
+
+@pytest.mark.parametrize("platform, expected", [('linux', 2048 * 1024), ('darwin', 2048)])
+def test_max_rss_is_in_bytes_on_every_platform(monkeypatch, platform, expected):
+    """Test the peak resident memory is converted to bytes from each platform's own unit."""
+    import resource
+    from catchment import instrument
+
+    monkeypatch.setattr(instrument.sys, 'platform', platform)
+    monkeypatch.setattr(resource, 'getrusage', lambda who: type('Usage', (), {'ru_maxrss': 2048})())
+    assert instrument._max_rss_bytes() == expected
@@ -1,5 +1,7 @@
 """Tests for statistics functions within the Model layer."""
 
+import numpy as np
+import numpy.testing as npt
 import pandas as pd
 import pandas.testing as pdt
 import datetime
@@ -150,4 +152,290 @@ def test_normalise(test_data, test_index, test_columns, expected_data, expected_
     from catchment.models import data_normalise
     pdt.assert_frame_equal(data_normalise(pd.DataFrame(data=test_data, index=test_index, columns=test_columns)),
                            pd.DataFrame(data=expected_data, index=expected_index, columns=expected_columns),
-                           atol=1e-2)
\ No newline at end of file
+                           atol=1e-2)
+
+def test_parse_dates_dayfirst_and_iso():
+    """Test day-first and ISO 8601 date strings are both parsed correctly."""
+    from catchment.models import parse_dates
+
+    expected = pd.DatetimeIndex([pd.to_datetime('2005-12-01 00:15'),
+                                 pd.to_datetime('2005-12-13 00:00')])
+    pdt.assert_index_equal(parse_dates(['01/12/2005 00:15', '13/12/2005 00:00']), expected)
+    pdt.assert_index_equal(parse_dates(['2005-12-01 00:15:00', '2005-12-13 00:00:00']), expected)
+    pdt.assert_index_equal(parse_dates(['2005-12-01 00:15:00', '13/12/2005 00:00']), expected)
+
+
+def test_long_to_wide_unsorted_with_missing_values():
+    """Test long records are pivoted to sorted dates, with NaN where a site has no reading."""
+    from catchment.models import long_to_wide
+
+    dates = [pd.to_datetime('2000-01-01 02:00'), pd.to_datetime('2000-01-01 01:00'),
+             pd.to_datetime('2000-01-01 01:00')]
+    result = long_to_wide(dates, ['A', 'A', 'B'], [2, 1, 3])
+
+    expected = pd.DataFrame(
+        data=[[1.0, 3.0], [2.0, np.nan]],
+        index=[pd.to_datetime('2000-01-01 01:00'), pd.to_datetime('2000-01-01 02:00')],
+        columns=['A', 'B']
+    )
+    pdt.assert_frame_equal(result, expected)
+
+
+def test_long_to_wide_categorical_sites_and_dates():
+    """Test categorical dates and site IDs give the same frame, with plain object site columns."""
+    from catchment.models import long_to_wide, parse_dates
+
+    dates = pd.Series(['01/01/2000 02:00', '01/01/2000 01:00', '01/01/2000 01:00'], dtype='category')
+    sites = pd.Series(['B', 'A', 'B'], dtype='category')
+    result = long_to_wide(parse_dates(dates), sites, [2, 1, 3])
+
+    expected = long_to_wide(parse_dates(list(dates)), list(sites), [2, 1, 3])
+    pdt.assert_frame_equal(result, expected)
+    assert list(result.columns) == ['B', 'A']
+    assert result.columns.dtype == object
+
+
+def test_read_variable_from_csv_drops_records_without_site_or_date(tmp_path):
+    """Test a record with a blank Site or Date is dropped rather than overwriting another reading."""
+    from catchment.models import read_variable_from_csv
+
+    filename = tmp_path / 'blanks.csv'
+    filename.write_text('Site,Date,Rainfall (mm)\n'
+                        'A,2005-12-01 00:00,1.0\n'
+                        'B,2005-12-01 00:00,2.0\n'
+                        'A,2005-12-01 00:15,3.0\n'
+                        'B,2005-12-01 00:15,4.0\n'
+                        ',2005-12-01 00:15,9.0\n'
+                        'B,,8.0\n')
+
+    result = read_variable_from_csv(filename)
+    expected = pd.DataFrame([[1.0, 2.0], [3.0, 4.0]],
+                            index=pd.to_datetime(['2005-12-01 00:00', '2005-12-01 00:15']),
+                            columns=pd.Index(['A', 'B'], dtype=object))
+    pdt.assert_frame_equal(result, expected)
+
+
+def test_read_variable_from_csv_keeps_first_of_duplicated_readings(tmp_path):
+    """Test the first reading of a repeated time and site is kept, as it is by quality control."""
+    from catchment.models import read_variable_from_csv
+    from catchment.quality import read_checked_csv
+
+    filename = tmp_path / 'duplicates.csv'
+    filename.write_text('Site,Date,Rainfall (mm)\n'
+                        'A,2005-12-01 00:00,1.0\n'
+                        'A,2005-12-01 00:15,2.0\n'
+                        'A,2005-12-01 00:00,9.0\n'
+                        'A,2005-12-01 00:15,8.0\n')
+
+    result = read_variable_from_csv(filename)
+    npt.assert_array_equal(result['A'], [1.0, 2.0])
+    cleaned, _, _ = read_checked_csv(filename)
+    pdt.assert_frame_equal(result, cleaned, check_freq=False)
+
+
+@pytest.mark.parametrize(
+    "value, end, expected",
+    [
+        ('2005-12-02', False, '2005-12-02 00:00'),
+        ('2005-12-02', True, '2005-12-02 23:59:59.999999999'),
+        ('2005-12-02 06:00', True, '2005-12-02 06:00'),
+        ('2005/12/01', False, '2005-12-01 00:00'),
+        ('2005.12.13 06:00', False, '2005-12-13 06:00'),
+        ('02/12/2005', True, '2005-12-02 23:59:59.999999999'),
+        ('02/12/2005 06:00', False, '2005-12-02 06:00'),
+        (datetime.date(2005, 12, 2), True, '2005-12-02 23:59:59.999999999'),
+        (pd.Timestamp('2005-12-02'), True, '2005-12-02 00:00'),
+        (None, True, None),
+    ])
+def test_parse_bound(value, end, expected):
+    """Test range bounds are read year first or day first, and an end date alone covers the whole day."""
+    from catchment.models import parse_bound
+    assert parse_bound(value, end) == (None if expected is None else pd.Timestamp(expected))
+
+
+@pytest.mark.parametrize("stream_bytes", [0, 256 * 1024 ** 2])
+@pytest.mark.parametrize("site", ['null', '""'])
+def test_read_variable_from_json_drops_records_without_site(tmp_path, monkeypatch, site, stream_bytes):
+    """Test a JSON record with a null or empty Site is dropped, whether the file is streamed or parsed whole."""
+    from catchment import models
+
+    monkeypatch.setattr(models, 'JSON_STREAM_BYTES', stream_bytes)
+
+    filename = tmp_path / 'blanks.json'
+    filename.write_text('{"Site": "A", "Date": "2005-12-01 00:00", "Rainfall (mm)": 1.0}\n'
+                        f'{{"Site": {site}, "Date": "2005-12-01 00:00", "Rainfall (mm)": 9.0}}\n'
+                        '{"Site": "A", "Date": "2005-12-01 00:15", "Rainfall (mm)": 2.0}\n')
+
+    result = models.read_variable_from_json(filename)
+    assert list(result.columns) == ['A']
+    npt.assert_array_equal(result['A'], [1.0, 2.0])
+
+
+def test_read_variable_from_csv_chunked_matches_full_read():
+    """Test reading in small chunks gives the same frame as reading the whole file."""
+    from catchment.models import read_variable_from_csv, read_variable_from_csv_chunked
+
+    filename = 'data/rain_data_2015-12.csv'
+    pdt.assert_frame_equal(read_variable_from_csv_chunked(filename, chunksize=1000),
+                           read_variable_from_csv(filename))
+
+
+def test_read_daily_summary_from_csv_matches_daily_functions():
+    """Test daily statistics folded chunk by chunk match those of the full data."""
+    from catchment.models import read_variable_from_csv, read_daily_summary_from_csv, daily_total, daily_max
+
+    filename = 'data/rain_data_2015-12.csv'
+    data = read_variable_from_csv(filename)
+    summary = read_daily_summary_from_csv(filename, stats=['sum', 'max'], chunksize=1000)
+
+    pdt.assert_frame_equal(summary['sum'], daily_total(data))
+    pdt.assert_frame_equal(summary['max'], daily_max(data))
+
+
+def test_daily_summary_skips_missing_values():
+    """Test all daily statistics are computed together, ignoring NaN like pandas does."""
+    from catchment.models import daily_summary
+
+    data = pd.DataFrame(
+        data=[[1.0, np.nan], [3.0, np.nan], [5.0, 2.0], [7.0, 4.0]],
+        index=[pd.to_datetime('2000-01-01 01:00'), pd.to_datetime('2000-01-01 02:00'),
+               pd.to_datetime('2000-01-02 01:00'), pd.to_datetime('2000-01-02 02:00')],
+        columns=['A', 'B']
+    )
+    summary = daily_summary(data, ['sum', 'mean', 'max', 'min', 'std', 'count'])
+    days = data.groupby(data.index.date)
+
+    for stat, result in summary.items():
+        pdt.assert_frame_equal(result, getattr(days, stat)())
+
+
+def test_daily_summary_unknown_statistic():
+    """Test for ValueError when asking for a statistic that is not supported"""
+    from catchment.models import daily_summary
+
+    data = pd.DataFrame(data=[[1.0]], index=[pd.to_datetime('2000-01-01 01:00')], columns=['A'])
+    with pytest.raises(ValueError):
+        daily_summary(data, ['median'])
+
+
+def test_read_variables_from_csv_matches_single_reads():
+    """Test reading several measurements in one parse matches reading each one separately."""
+    from catchment.models import read_variable_from_csv, read_variables_from_csv
+
+    filename = 'data/river_data_2015-12.csv'
+    measurements = ['pH continuous', 'Water level continuous (mm)']
+    result = read_variables_from_csv(filename, measurements)
+
+    assert list(result) == measurements
+    for measurement in measurements:
+        pdt.assert_frame_equal(result[measurement], read_variable_from_csv(filename, measurement))
+
+
+def test_read_variable_from_xml_streaming_matches_csv():
+    """Test the streamed XML reader gives the same data as the CSV export, whatever its buffer size."""
+    from catchment.models import read_variable_from_csv, read_variable_from_xml
+
+    expected = read_variable_from_csv('data/rain_data_2015-12.csv')
+    pdt.assert_frame_equal(read_variable_from_xml('data/rain_data_2015-12.xml', buffer_size=500), expected)
+
+
+@pytest.mark.parametrize("stream_bytes", [0, 256 * 1024 ** 2])
+def test_read_variable_from_json_newline_delimited(tmp_path, monkeypatch, stream_bytes):
+    """Test newline-delimited JSON gives the same data as a JSON array, streamed in small pieces or parsed whole."""
+    import json
+    from catchment import models
+
+    monkeypatch.setattr(models, 'JSON_STREAM_BYTES', stream_bytes)
+
+    with open('data/rain_data_small.json') as json_file:
+        records = json.load(json_file)
+    filename = tmp_path / 'rain_data_small.ndjson'
+    filename.write_text('\n'.join(json.dumps(record) for record in records) + '\n')
+
+    monkeypatch.setattr(models, 'JSON_READ_SIZE', 50)
+    pdt.assert_frame_equal(models.read_variable_from_json(filename),
+                           models.read_variable_from_json('data/rain_data_small.json'))
+
+
+@pytest.mark.parametrize(
+    "reader, filename, measurement, sites, stream_bytes",
+    [
+        ('read_variable_from_csv', 'data/river_data_2015-12.csv', 'pH continuous', ['FP15', 'TE20'], None),
+        ('read_variable_from_json', 'data/river_data_2015-12.json', 'pH continuous', ['FP15', 'TE20'], None),
+        ('read_variable_from_json', 'data/river_data_2015-12.json', 'pH continuous', ['FP15', 'TE20'], 0),
+        ('read_variable_from_csv_chunked', 'data/river_data_2015-12.csv', 'pH continuous', ['FP15', 'TE20'], None),
+        ('read_variable_from_xml', 'data/rain_data_2015-12.xml', 'Rainfall_mm', ['PL16'], None),
+    ])
+def test_read_with_date_and_site_filters(monkeypatch, reader, filename, measurement, sites, stream_bytes):
+    """Test filtering while parsing gives the same data as filtering after reading everything."""
+    from catchment import cache, models
+
+    # With the cache on, filters are applied to the cached whole file instead
+    monkeypatch.setattr(cache, '_enabled', False)
+    if stream_bytes is not None:
+        monkeypatch.setattr(models, 'JSON_STREAM_BYTES', stream_bytes)
+    # Small buffers make the streamed readers filter several buffers of records
+    options = {} if reader in ('read_variable_from_csv', 'read_variable_from_csv_chunked') else {'buffer_size': 500}
+
+    read = getattr(models, reader)
+    data = read(filename, measurement, **options)
+    expected = data.loc['2005-12-10':'2005-12-12 12:00', list(reversed(sites))].dropna(how='all')
+
+    result = read(filename, measurement, start='2005-12-10', end='2005-12-12 12:00', sites=sites, **options)
+    pdt.assert_frame_equal(result, expected[result.columns])
+    assert sorted(result.columns) == sites
+
+
+@pytest.mark.parametrize("period", ['h', '6h', 'D', '2D'])
+def test_resample_summary_matches_pandas_fixed_periods(period):
+    """Test fixed period statistics match pandas resampling aligned to the epoch."""
+    from catchment.models import read_variable_from_csv, resample_summary
+
+    data = read_variable_from_csv('data/rain_data_2015-12.csv')
+    result = resample_summary(data, period, ['sum', 'max', 'std'])
+
+    resampled = data.resample(period, origin='epoch')
+    for stat in ['sum', 'max', 'std']:
+        pdt.assert_frame_equal(result[stat], getattr(resampled, stat)(), check_freq=False)
+
+
+@pytest.mark.parametrize(
+    "period, expected_starts",
+    [
+        ('W', ['2005-11-28', '2005-12-05', '2005-12-12', '2005-12-19', '2005-12-26']),
+        ('W-WED', ['2005-12-01', '2005-12-08', '2005-12-15', '2005-12-22', '2005-12-29']),
+        ('MS', ['2005-12-01']),
+        ('QE', ['2005-10-01']),
+        ('YS', ['2005-01-01']),
+    ])
+def test_resample_summary_calendar_periods(period, expected_starts):
+    """Test calendar periods are labelled by their start and match pandas periods."""
+    from catchment.models import read_variable_from_csv, resample_summary
+
+    data = read_variable_from_csv('data/rain_data_2015-12.csv')
+    result = resample_summary(data, period, ['sum'])['sum']
+
+    pdt.assert_index_equal(result.index, pd.DatetimeIndex(expected_starts))
+    pandas_period = {'MS': 'M', 'QE': 'Q', 'YS': 'Y'}.get(period, period)
+    npt.assert_array_almost_equal(result, data.groupby(data.index.to_period(pandas_period)).sum())
+
+
+@pytest.mark.parametrize("window", ['24h', '1h', 4])
+def test_rolling_summary_matches_pandas(window):
+    """Test cumulative sum windows match pandas rolling windows, with dry windows exactly zero."""
+    from catchment.models import read_variable_from_csv, rolling_summary
+
+    data = read_variable_from_csv('data/rain_data_2015-12.csv')
+    result = rolling_summary(data, window, ['sum', 'mean', 'count'])
+
+    for stat in ['sum', 'mean', 'count']:
+        pdt.assert_frame_equal(result[stat], getattr(data.rolling(window, min_periods=1), stat)(), atol=1e-9)
+    assert not (result['sum'] < 0).any(axis=None)
+
+
+def test_resample_unsupported_period():
+    """Test business day periods, which are not a fixed length, are rejected."""
+    from catchment.models import period_bins
+
+    with pytest.raises(ValueError):
+        period_bins(pd.DatetimeIndex(['2000-01-01']), 'B')
@@ -0,0 +1,65 @@
+"""Tests for chunked normalisation of catchment data."""
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from pathlib import Path
+
+
+@pytest.fixture
+def readings():
+    """Readings of a site with a gap, a dry site and a site with no readings at all."""
+    return pd.DataFrame(data=[[1.0, 0.0, np.nan], [np.nan, 0.0, np.nan], [3.0, 0.0, np.nan], [5.0, 0.0, np.nan]],
+                        index=pd.date_range('2000-01-01', periods=4, freq='15min'),
+                        columns=['A', 'B', 'C'])
+
+
+@pytest.mark.parametrize(
+    "mode, expected_a",
+    [
+        ('max', [0.2, np.nan, 0.6, 1.0]),
+        ('minmax', [0.0, np.nan, 0.5, 1.0]),
+        ('zscore', [-1.224745, np.nan, 0.0, 1.224745]),
+    ])
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_normalise_frame_modes(readings, mode, expected_a, chunk_size):
+    """Test each mode ignores missing readings, and gives sites with no spread zero rather than NaN."""
+    from catchment.normalise import normalise_frame
+
+    result = normalise_frame(readings, mode, chunk_size=chunk_size)
+
+    npt.assert_array_almost_equal(result['A'], expected_a)
+    npt.assert_array_equal(result['B'], [0.0, 0.0, 0.0, 0.0])
+    assert result['C'].isna().all()
+    pdt.assert_index_equal(result.index, readings.index)
+
+
+def test_normalise_array_in_place():
+    """Test normalising in place writes the result into the given array."""
+    from catchment.normalise import normalise_array
+
+    values = np.array([[1.0, 2.0], [4.0, 8.0]])
+    result = normalise_array(values, 'max', out=values, chunk_size=1)
+
+    assert result is values
+    npt.assert_array_equal(values, [[0.25, 0.25], [1.0, 1.0]])
+
+
+def test_normalise_store(tmp_path):
+    """Test normalising a store gives the same result as normalising the loaded data."""
+    from catchment.models import data_normalise, read_variable_from_csv
+    from catchment.normalise import normalise_store
+    from catchment.store import write_store, MemmapStore
+
+    data = read_variable_from_csv(Path.cwd() / "data" / "rain_data_2015-12.csv")
+    write_store(tmp_path, [data])
+
+    normalise_store(MemmapStore(tmp_path), mode='zscore', output='Rainfall (z-score)', chunk_size=100)
+    normalise_store(MemmapStore(tmp_path), chunk_size=100)
+
+    data_store = MemmapStore(tmp_path)
+    pdt.assert_frame_equal(data_store.read('Rainfall (mm)'), data_normalise(data), check_freq=False)
+    pdt.assert_frame_equal(data_store.read('Rainfall (z-score)'), data_normalise(data, 'zscore'),
+                           check_freq=False)
@@ -0,0 +1,102 @@
+"""Tests for quality control of logger data."""
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pytest
+
+
+def test_check_records_flags_gaps_duplicates_and_off_cadence_readings():
+    """Test missing times are added, the first of duplicated readings is kept and off-cadence readings dropped."""
+    from catchment.quality import DUPLICATE, MISSING, check_records
+
+    dates = pd.to_datetime(['2000-01-01 00:00', '2000-01-01 00:00', '2000-01-01 00:30',
+                            '2000-01-01 00:07', '2000-01-01 00:15'])
+    cleaned, flags, summary = check_records(dates, ['A', 'A', 'A', 'A', 'B'], [1.0, 2.0, 3.0, 9.0, 4.0])
+
+    npt.assert_array_equal(cleaned.index, pd.date_range('2000-01-01 00:00', periods=3, freq='15min'))
+    npt.assert_array_equal(cleaned['A'], [1.0, np.nan, 3.0])
+    npt.assert_array_equal(cleaned['B'], [np.nan, 4.0, np.nan])
+    npt.assert_array_equal(flags['A'], [DUPLICATE, MISSING, 0])
+    assert flags.dtypes.unique().tolist() == [np.uint8]
+    assert summary.loc['A', ['missing', 'duplicate', 'readings', 'off_cadence']].tolist() == [1, 1, 2, 1]
+    assert summary.loc['B', ['missing', 'duplicate', 'readings', 'off_cadence']].tolist() == [2, 0, 1, 0]
+
+
+def test_check_records_grid_starts_on_cadence_boundary():
+    """Test an off-cadence first reading does not shift the grid off the readings on the cadence."""
+    from catchment.quality import check_records
+
+    dates = pd.to_datetime(['2000-01-01 00:07', '2000-01-01 00:15', '2000-01-01 00:30'])
+    cleaned, _, summary = check_records(dates, ['A', 'A', 'A'], [9.0, 1.0, 2.0])
+
+    npt.assert_array_equal(cleaned.index, pd.date_range('2000-01-01 00:00', periods=3, freq='15min'))
+    npt.assert_array_equal(cleaned['A'], [np.nan, 1.0, 2.0])
+    assert summary.loc['A', ['readings', 'off_cadence']].tolist() == [2, 1]
+
+
+def test_check_records_drops_records_without_site_or_date():
+    """Test records with no site or no date are dropped, those with no date being counted."""
+    from catchment.quality import check_records
+
+    dates = pd.to_datetime(['2000-01-01 00:00', '2000-01-01 00:15', '2000-01-01 00:15', None])
+    cleaned, _, summary = check_records(dates, ['A', 'A', None, 'A'], [1.0, 2.0, 9.0, 8.0])
+
+    npt.assert_array_equal(cleaned.index, pd.date_range('2000-01-01 00:00', periods=2, freq='15min'))
+    assert list(cleaned.columns) == ['A']
+    npt.assert_array_equal(cleaned['A'], [1.0, 2.0])
+    assert summary.loc['A', ['readings', 'no_date']].tolist() == [2, 1]
+
+
+def test_check_records_drops_readings_far_from_the_rest():
+    """Test a corrupt far-future timestamp is dropped and counted rather than stretching the grid."""
+    from catchment.quality import check_records
+
+    dates = pd.to_datetime(['2000-01-01 00:00', '2000-01-01 00:15', '2200-01-01 00:00', '2000-01-01 00:30'])
+    cleaned, _, summary = check_records(dates, ['A', 'A', 'A', 'B'], [1.0, 2.0, 9.0, 3.0])
+
+    npt.assert_array_equal(cleaned.index, pd.date_range('2000-01-01 00:00', periods=3, freq='15min'))
+    assert summary.loc['A', ['readings', 'out_of_window']].tolist() == [2, 1]
+    assert summary.loc['B', ['readings', 'out_of_window']].tolist() == [1, 0]
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([[1], [1], [2], [2], [2], [np.nan], [np.nan]], [[2], [2], [3], [3], [3], [1], [1]]),
+        ([[5, 5], [5, 5], [5, 6]], [[3, 2], [3, 2], [3, 1]]),
+    ])
+def test_run_lengths(values, expected):
+    """Test runs of equal values are measured down each column, with NaN never part of a run."""
+    from catchment.quality import run_lengths
+    npt.assert_array_equal(run_lengths(np.array(values, dtype=float)), expected)
+
+
+def test_check_records_removes_stuck_spiking_and_low_battery_readings():
+    """Test stuck, spiking and low battery readings are flagged and removed, while repeated zeros are kept."""
+    from catchment.quality import LOW_BATTERY, SPIKE, STUCK, check_records
+
+    dates = pd.date_range('2000-01-01', periods=8, freq='15min')
+    values = [0.0, 0.0, 0.0, 7.0, 7.0, 7.0, 50.0, 8.0]
+    battery = [12.0, 12.0, 10.0, 12.0, 12.0, 12.0, 12.0, 12.0]
+    cleaned, flags, summary = check_records(dates, ['A'] * 8, values, battery, max_jump=20, stuck_run=3,
+                                            min_battery=11)
+
+    npt.assert_array_equal(flags['A'], [0, 0, LOW_BATTERY, STUCK, STUCK, STUCK, SPIKE, 0])
+    npt.assert_array_equal(cleaned['A'], [0.0, 0.0, np.nan, np.nan, np.nan, np.nan, np.nan, 8.0])
+    assert summary.loc['A', ['stuck', 'spike', 'low_battery']].tolist() == [3, 1, 1]
+
+
+def test_read_checked_csv_matches_reader_on_clean_data():
+    """Test checking the river data keeps the readings of the plain reader, and reads the battery voltage."""
+    from catchment.models import read_variable_from_csv
+    from catchment.quality import read_checked_csv
+
+    measurement = 'Water level continuous (mm)'
+    cleaned, flags, summary = read_checked_csv('data/river_data_2015-12.csv', measurement, 'Battery (V)')
+
+    pd.testing.assert_frame_equal(cleaned, read_variable_from_csv('data/river_data_2015-12.csv', measurement),
+                                  check_freq=False)
+    assert summary.loc['FP15', 'missing'] == 3
+    assert summary['duplicate'].sum() == 0
+    assert (summary['readings'] + summary['missing'] == len(flags)).all()
@@ -0,0 +1,126 @@
+"""Tests for the resident analysis server."""
+
+import os
+import shutil
+import threading
+import pandas.testing as pdt
+import pytest
+from pathlib import Path
+
+
+@pytest.fixture
+def running_server(tmp_path):
+    """Serve a copy of the December rain data from a background thread."""
+    from catchment.compute_data import CSVDataSource
+    from catchment.server import AnalysisServer
+
+    shutil.copy(Path.cwd() / "data" / "rain_data_2015-12.csv", tmp_path / "rain_data_2015-12.csv")
+    server = AnalysisServer(CSVDataSource(tmp_path), port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_daily_statistics_match_models(running_server):
+    """Test daily statistics for a site and date range match those calculated directly."""
+    from catchment.models import daily_summary, read_variable_from_csv
+    from catchment.server import query, to_frame
+
+    port = running_server.server_address[1]
+    answer = query('daily', port, file='rain_data_2015-12.csv', stats='sum,max', sites='PL16',
+                   **{'from': '2005-12-03', 'to': '2005-12-09 23:45'})
+
+    data = read_variable_from_csv(Path.cwd() / "data" / "rain_data_2015-12.csv")
+    expected = daily_summary(data.loc['2005-12-03':'2005-12-09 23:45', ['PL16']], ['sum', 'max'])
+    for stat in ['sum', 'max']:
+        pdt.assert_frame_equal(to_frame(answer[stat]), expected[stat].set_axis(to_frame(answer[stat]).index))
+
+
+def test_files_are_read_once_until_changed(running_server, tmp_path):
+    """Test repeated requests reuse the file in memory, and a modified file is read again."""
+    from catchment.server import query
+
+    port = running_server.server_address[1]
+    query('normalised', port, file='rain_data_2015-12.csv')
+    query('std', port)
+    assert query('status', port)['reads'] == 1
+
+    filename = tmp_path / "rain_data_2015-12.csv"
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    query('std', port)
+    assert query('status', port)['reads'] == 2
+
+
+def test_unknown_file_is_an_error(running_server):
+    """Test the server answers requests for files outside the data source with an error."""
+    from catchment.server import query
+
+    with pytest.raises(ValueError, match='No such file'):
+        query('daily', running_server.server_address[1], file='../secret.csv')
+
+
+def test_least_recently_used_frames_are_dropped(tmp_path):
+    """Test the frames held stay within the size limit, dropping the least recently used."""
+    from catchment.compute_data import CSVDataSource
+    from catchment.server import FrameCache
+
+    for month in ['2015-11', '2015-12']:
+        shutil.copy(Path.cwd() / "data" / "rain_data_2015-12.csv", tmp_path / f"rain_data_{month}.csv")
+    frames = FrameCache(CSVDataSource(tmp_path), max_bytes=100_000)
+    for path in frames.files().values():
+        frames.get(path)
+
+    assert frames.status()['files'] == ['rain_data_2015-12.csv']
+    assert frames.status()['bytes'] <= 100_000
+
+
+def test_reading_a_file_does_not_hold_up_other_files(tmp_path):
+    """Test a file held in memory is returned while another file is still being read."""
+    from catchment.compute_data import CSVDataSource
+    from catchment.server import FrameCache
+
+    class SlowDataSource(CSVDataSource):
+        def read_file(self, path):
+            if path.endswith('2015-11.csv'):
+                release.wait(10)
+            return super().read_file(path)
+
+    for month in ['2015-11', '2015-12']:
+        shutil.copy(Path.cwd() / "data" / "rain_data_2015-12.csv", tmp_path / f"rain_data_{month}.csv")
+    release = threading.Event()
+    frames = FrameCache(SlowDataSource(tmp_path))
+    files = frames.files()
+    frames.get(files['rain_data_2015-12.csv'])
+
+    slow = threading.Thread(target=frames.get, args=(files['rain_data_2015-11.csv'],))
+    slow.start()
+    try:
+        frames.get(files['rain_data_2015-12.csv'])
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
+    assert frames.status()['reads'] == 2
+
+
+def test_unexpected_errors_are_answered(tmp_path):
+    """Test an unexpected error while answering a request is returned to the client as an error."""
+    from catchment.compute_data import CSVDataSource
+    from catchment.server import AnalysisServer, query
+
+    class BrokenDataSource(CSVDataSource):
+        def read_file(self, path):
+            raise RuntimeError('disk on fire')
+
+    shutil.copy(Path.cwd() / "data" / "rain_data_2015-12.csv", tmp_path / "rain_data_2015-12.csv")
+    with AnalysisServer(BrokenDataSource(tmp_path), port=0, quiet=True) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with pytest.raises(ValueError, match='RuntimeError: disk on fire'):
+                query('daily', server.server_address[1], file='rain_data_2015-12.csv')
+        finally:
+            server.shutdown()
@@ -0,0 +1,57 @@
+"""Tests for grouping measurement sites by catchment."""
+
+import os
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+from pathlib import Path
+
+
+def test_site_catchments_assigns_and_reuses_mapping():
+    """Test each LOCAR site is placed in the catchment matching its code, and the mapping is saved."""
+    from catchment import cache
+    from catchment.spatial import site_catchments
+
+    site_info = Path.cwd() / "data" / "LOCAR_Site_Information.csv"
+    catchment_dir = Path.cwd() / "data" / "river_catchments"
+    mapping = site_catchments(site_info, catchment_dir)
+
+    expected = {'FP': 'frome_piddle', 'PL': 'pang_lambourn', 'TE': 'tern'}
+    assert len(mapping) == 35
+    assert all(catchment == expected[site[:2]] for site, catchment in mapping.items())
+
+    assert len(os.listdir(cache.cache_dir())) == 1
+    pdt.assert_series_equal(site_catchments(site_info, catchment_dir), mapping)
+
+
+def test_site_catchments_mapping_is_a_cache_entry():
+    """Test saved mappings are removed by clearing and evicting the cache, so they cannot build up."""
+    from catchment import cache
+    from catchment.spatial import site_catchments
+
+    site_info = Path.cwd() / "data" / "LOCAR_Site_Information.csv"
+    catchment_dir = Path.cwd() / "data" / "river_catchments"
+    site_catchments(site_info, catchment_dir)
+    cache.clear()
+    assert os.listdir(cache.cache_dir()) == []
+
+    site_catchments(site_info, catchment_dir)
+    cache.evict(max_bytes=0)
+    assert os.listdir(cache.cache_dir()) == []
+
+
+def test_catchment_aggregate():
+    """Test per-site columns roll up to catchment statistics, ignoring unknown sites and NaN."""
+    from catchment.spatial import catchment_aggregate
+
+    data = pd.DataFrame(data=[[1.0, 3.0, 10.0, 7.0], [2.0, np.nan, 20.0, 7.0]],
+                        index=pd.to_datetime(['2000-01-01', '2000-01-02']),
+                        columns=['FP01', 'FP02', 'TE03', 'XX99'])
+    mapping = pd.Series({'FP01': 'frome_piddle', 'FP02': 'frome_piddle', 'TE03': 'tern'})
+
+    result = catchment_aggregate(data, mapping, ['mean', 'count'])
+
+    pdt.assert_frame_equal(result['mean'], pd.DataFrame(data=[[2.0, 10.0], [2.0, 20.0]], index=data.index,
+                                                        columns=['frome_piddle', 'tern']))
+    pdt.assert_frame_equal(result['count'], pd.DataFrame(data=[[2, 1], [1, 1]], index=data.index,
+                                                         columns=['frome_piddle', 'tern']))
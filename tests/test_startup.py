@@ -0,0 +1,45 @@
+"""Tests that the command line tool and the catchment package start quickly."""
+
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+# Total time allowed for imports by `catchment-analysis.py --help`, in microseconds
+STARTUP_BUDGET_US = 250_000
+
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'geopandas')
+
+
+def import_times(*args):
+    """Run Python with -X importtime, returning a dictionary of top-level module -> cumulative import time."""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + list(args),
+                            capture_output=True, text=True, check=True, cwd=Path.cwd())
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative)
+    return times, result.stdout
+
+
+def test_help_does_not_import_heavy_modules():
+    """Test --help is answered within the startup budget, without loading pandas, NumPy or Matplotlib."""
+    times, output = import_times('catchment-analysis.py', '--help')
+
+    assert '--full-data-analysis' in output
+    assert not [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+    assert sum(times.values()) < STARTUP_BUDGET_US
+
+
+@pytest.mark.parametrize("module", ['catchment.models', 'catchment.compute_data', 'catchment.dataset',
+                                    'catchment.spatial', 'catchment.store', 'catchment.incremental',
+                                    'catchment.normalise', 'catchment.instrument', 'catchment.server',
+                                    'catchment.correlation', 'catchment.quality'])
+def test_modules_do_not_import_plotting_or_spatial_libraries(module):
+    """Test Matplotlib and geopandas are only imported by the functions that use them."""
+    code = f'import sys, {module}; print(sorted(name for name in sys.modules if name.split(".")[0] in {HEAVY_MODULES[2:]}))'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
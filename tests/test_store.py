@@ -0,0 +1,37 @@
+"""Tests for the memory-mapped catchment data store."""
+
+import numpy.testing as npt
+import pandas as pd
+import pandas.testing as pdt
+from pathlib import Path
+
+
+def test_analyse_data_from_store_matches_csv(tmp_path):
+    """Test converting a CSV data source to a store leaves analyse_data unchanged."""
+    from catchment.compute_data import analyse_data, CSVDataSource, MemmapDataSource
+    from catchment.store import convert_data_source
+
+    csv_source = CSVDataSource(Path.cwd() / "data")
+    convert_data_source(csv_source, tmp_path / "store",
+                        site_info_path=Path.cwd() / "data" / "LOCAR_Site_Information.csv")
+
+    npt.assert_array_almost_equal(analyse_data(MemmapDataSource(tmp_path / "store")),
+                                  analyse_data(csv_source))
+
+
+def test_read_window_and_sites(tmp_path):
+    """Test reading a time window for one site, across data files."""
+    from catchment.models import read_variable_from_csv
+    from catchment.store import write_store, MemmapStore
+
+    december = read_variable_from_csv(Path.cwd() / "data" / "rain_data_2015-12.csv")
+    later = december.set_axis(december.index + pd.Timedelta(days=31))
+    write_store(tmp_path, [december, later], names=['december', 'january'], dtype='float32')
+
+    data_store = MemmapStore(tmp_path)
+    assert data_store.sites == ['FP35', 'PL16']
+    result = data_store.read('Rainfall (mm)', sites=['PL16'], start='2005-12-31 12:00', end='2006-01-01 23:45')
+
+    expected = pd.concat([december, later]).loc['2005-12-31 12:00':'2006-01-01 23:45', ['PL16']]
+    assert len(expected) == 144
+    pdt.assert_frame_equal(result, expected, check_dtype=False)
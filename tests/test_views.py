@@ -0,0 +1,37 @@
+"""Tests for the View layer's file outputs."""
+
+import subprocess
+import sys
+import datetime
+import pandas as pd
+import pandas.testing as pdt
+
+
+def test_save_data_csv_round_trip(tmp_path):
+    """Test daily statistics are written to one CSV file per statistic, indexed by date."""
+    from catchment.views import save_data
+
+    daily = pd.DataFrame(data=[[1.0, 2.0]], index=[datetime.date(2000, 1, 1)], columns=['FP35', 'PL16'])
+    filenames = save_data({'daily sum': daily}, tmp_path, 'rain (mm)')
+
+    assert filenames == [str(tmp_path / 'rain_mm_daily_sum.csv')]
+    written = pd.read_csv(filenames[0], index_col='Date', parse_dates=True)
+    pdt.assert_frame_equal(written, daily.set_axis(pd.DatetimeIndex(daily.index, name='Date')))
+
+
+def test_save_figure(tmp_path):
+    """Test plots can be saved to a file without a display."""
+    from catchment.views import save_figures
+
+    daily = pd.DataFrame(data=[[1.0, 2.0], [3.0, 4.0]], index=pd.to_datetime(['2000-01-01', '2000-01-02']),
+                         columns=['FP35', 'PL16'])
+    save_figures([({'daily sum': daily}, tmp_path / 'plot.png')])
+
+    assert (tmp_path / 'plot.png').stat().st_size > 0
+
+
+def test_batch_modules_do_not_import_matplotlib():
+    """Test the models, compute_data and views modules can be loaded without Matplotlib."""
+    code = ('import sys; import catchment.models, catchment.compute_data, catchment.views; '
+            'sys.exit("matplotlib" in sys.modules)')
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0